@@ -0,0 +1,122 @@
+import os
+import random
+import sys
+import tempfile
+import time
+import yaml
+
+
+# Make the plugin and the yamllistctl script importable
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+STATES = ['poweredOn', 'poweredOff', 'suspended']
+GUEST_IDS = [
+    'centos64Guest',
+    'rhel7_64Guest',
+    'ubuntu64Guest',
+    'windows8Server64Guest',
+    'windows9Server64Guest',
+]
+DATACENTERS = ['dc1', 'dc2', 'dc3']
+GROUPS = ['web', 'db', 'app', 'cache']
+TAGS = ['backup', 'monitored', 'pci', 'dmz', 'legacy', 'critical']
+
+
+def generate_hosts(count, seed=0, depth=0, fanout=2, lists=0):
+    # Deterministic list of host records similar to a vCenter export. The
+    # depth adds nested 'meta' dictionary, the fanout sets the number of
+    # groups of the grouped hosts and the lists sets the number of items of
+    # the list-valued fields.
+    rnd = random.Random(seed)
+    hosts = []
+    groups = GROUPS + [
+        'group%03d' % i for i in range(max(0, 2 * fanout - len(GROUPS)))]
+
+    for i in range(count):
+        dc = rnd.choice(DATACENTERS)
+        host = {
+            'name': '%s-prd-host%06d' % (dc, i),
+            'ip': '10.%d.%d.%d' % (i >> 16 & 255, i >> 8 & 255, i & 255),
+            'state': rnd.choice(STATES),
+            'vcenter': {
+                'datacenter': dc,
+                'guest_id': rnd.choice(GUEST_IDS),
+                'uuid': '%032x' % rnd.getrandbits(128),
+            },
+        }
+
+        if rnd.random() < 0.3:
+            host['ansible'] = {
+                'group': rnd.sample(groups, fanout),
+            }
+
+        if depth > 0:
+            node = {}
+            host['meta'] = node
+
+            for level in range(1, depth):
+                node['level%d' % level] = {'id': rnd.randrange(100)}
+                node = node['level%d' % level]
+
+            node['env'] = rnd.choice(['prd', 'stg', 'dev'])
+
+        if lists > 0:
+            host['tags'] = [rnd.choice(TAGS) for _ in range(lists)]
+            host['vcenter']['secondary_ips'] = [
+                '172.16.%d.%d' % (n, i & 255) for n in range(lists)]
+
+        hosts.append(host)
+
+    return hosts
+
+
+def write_data_file(hosts, path=None):
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix='.yaml')
+        os.close(fd)
+
+    with open(path, 'w') as f:
+        f.write("---\n\n")
+        yaml.dump(
+            hosts, f,
+            Dumper=getattr(yaml, 'CSafeDumper', yaml.SafeDumper),
+            default_flow_style=False)
+
+    return path
+
+
+def timeit(func, repeat=3, setup=None):
+    # Return the best wall time of several runs. The setup is called before
+    # each run and is not included in the time.
+    best = None
+
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def get_plugin(**options):
+    # Returns the plugin with the options set and an empty inventory
+    from ansible.inventory.data import InventoryData
+    from ansible.plugins.loader import inventory_loader
+
+    inventory_loader.add_directory(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    plugin = inventory_loader.get('yaml_list')
+    plugin.set_options(direct=options)
+    plugin.inventory = InventoryData()
+    plugin._created_groups = set()
+
+    return plugin
@@ -0,0 +1,82 @@
+import argparse
+
+from benchmarks.common import generate_hosts, get_plugin, timeit
+
+
+ACCEPT = [
+    {
+        'state': '~^powered',
+    },
+]
+IGNORE = [
+    {
+        'ip': None,
+    }, {
+        'vcenter.guest_id': '~^win',
+        '_ansible.group': '!~.*web',
+    },
+]
+GROUPING = dict(
+    ('%s_%s' % (dc, guest_id), [
+        {
+            'vcenter.datacenter': dc,
+            'vcenter.guest_id': guest_id,
+        },
+    ])
+    for dc in ('dc1', 'dc2', 'dc3')
+    for guest_id in ('centos64Guest', 'rhel7_64Guest', 'ubuntu64Guest'))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the evaluation of the conditions.")
+    parser.add_argument(
+        '-n', '--hosts',
+        type=int,
+        default=10000,
+        help="Number of hosts.")
+    parser.add_argument(
+        '-r', '--repeat',
+        type=int,
+        default=3,
+        help="Number of runs (the best one is reported).")
+    args = parser.parse_args()
+
+    hosts = generate_hosts(args.hosts)
+    plugin = get_plugin(data_file='none')
+    accept = plugin._compile_conditions(ACCEPT)
+    ignore = plugin._compile_conditions(IGNORE)
+    grouping = [
+        plugin._compile_conditions(c) for c in GROUPING.values()]
+
+    def run():
+        for host in hosts:
+            if (
+                    plugin._match_conditions(host, accept) and
+                    not plugin._match_conditions(host, ignore, False)):
+                for program in grouping:
+                    plugin._match_conditions(host, program)
+
+    def run_bulk():
+        columns = {}
+        accepted = plugin._match_conditions_bulk(hosts, accept, columns)
+        ignored = plugin._match_conditions_bulk(hosts, ignore, columns, False)
+        selected = [
+            host for host, a, i in zip(hosts, accepted, ignored)
+            if a and not i]
+        columns = {}
+
+        for program in grouping:
+            plugin._match_conditions_bulk(selected, program, columns)
+
+    print("%d hosts, %d grouping rules" % (args.hosts, len(grouping)))
+
+    for name, func in (('per host', run), ('bulk', run_bulk)):
+        elapsed = timeit(func, args.repeat)
+
+        print("%-10s %8.3f s (%.1f us per host)" % (
+            name, elapsed, elapsed / args.hosts * 1e6))
+
+
+if __name__ == '__main__':
+    main()
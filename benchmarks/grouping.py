@@ -0,0 +1,54 @@
+import argparse
+
+from benchmarks.common import (
+    DATACENTERS, GUEST_IDS, STATES, generate_hosts, get_plugin, timeit)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Compare the evaluation of exact-match grouping rules host by "
+            "host and by the index."))
+    parser.add_argument(
+        '-n', '--hosts',
+        type=int,
+        default=50000,
+        help="Number of hosts.")
+    parser.add_argument(
+        '-g', '--groups',
+        type=int,
+        default=200,
+        help="Number of grouping rules.")
+    parser.add_argument(
+        '-r', '--repeat',
+        type=int,
+        default=1,
+        help="Number of runs (the best one is reported).")
+    args = parser.parse_args()
+
+    hosts = generate_hosts(args.hosts)
+    plugin = get_plugin(data_file='none')
+    grouping = [
+        ('group%03d' % i, plugin._compile_conditions([
+            {
+                'vcenter.datacenter': DATACENTERS[i % len(DATACENTERS)],
+                'vcenter.guest_id': GUEST_IDS[i % len(GUEST_IDS)],
+                'state': STATES[i // 15 % len(STATES)],
+            },
+        ]))
+        for i in range(args.groups)]
+
+    def per_host():
+        for host in hosts:
+            for group, program in grouping:
+                plugin._match_conditions(host, program)
+
+    print("%d hosts, %d grouping rules" % (args.hosts, args.groups))
+    print("%-10s %8.3f s" % ('per host', timeit(per_host, args.repeat)))
+    print("%-10s %8.3f s" % (
+        'index',
+        timeit(lambda: plugin._match_grouping(hosts, grouping), args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
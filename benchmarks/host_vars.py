@@ -0,0 +1,44 @@
+import argparse
+
+from benchmarks.common import generate_hosts, get_plugin, timeit
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Measure the per-host cost of building and setting the host "
+            "variables against the number of groups per host."))
+    parser.add_argument(
+        '-n', '--hosts',
+        type=int,
+        default=10000,
+        help="Number of hosts.")
+    parser.add_argument(
+        '-r', '--repeat',
+        type=int,
+        default=3,
+        help="Number of runs (the best one is reported).")
+    args = parser.parse_args()
+
+    print("%8s %14s" % ('groups', 'us per host'))
+
+    for n_groups in (1, 2, 4, 8, 16):
+        hosts = generate_hosts(args.hosts)
+
+        for host in hosts:
+            host['ansible'] = {
+                'group': ['group%02d' % i for i in range(n_groups)],
+                'ansible_user': 'user',
+            }
+
+        def run():
+            plugin = get_plugin(data_file='none', vars={'type': 'vm'})
+            plugin._populate(plugin._compute_entries(hosts))
+
+        elapsed = timeit(run, args.repeat)
+
+        print("%8d %14.1f" % (n_groups, elapsed / args.hosts * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import yaml
+from ansible.inventory.data import InventoryData
+from ansible.parsing.dataloader import DataLoader
+from ansible.plugins.loader import inventory_loader
+
+from benchmarks.common import generate_hosts, timeit, write_data_file
+from benchmarks.conditions import ACCEPT, GROUPING, IGNORE
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+inventory_loader.add_directory(ROOT_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Compare the parsing of a changed data file with the inventory "
+            "cache with and without the incremental evaluation."))
+    parser.add_argument(
+        '-n', '--hosts',
+        type=int,
+        default=50000,
+        help="Number of hosts.")
+    parser.add_argument(
+        '-c', '--changed',
+        type=float,
+        default=1,
+        help="Percentage of the changed hosts.")
+    parser.add_argument(
+        '-g', '--groups',
+        type=int,
+        default=100,
+        help="Number of additional regular expression grouping rules.")
+    parser.add_argument(
+        '-p', '--cache-plugin',
+        default='jsonfile',
+        help="Cache plugin.")
+    parser.add_argument(
+        '-x', '--index',
+        action='store_true',
+        help="Maintain the sidecar index of the data file.")
+    parser.add_argument(
+        '-r', '--repeat',
+        type=int,
+        default=3,
+        help="Number of runs (the best one is reported).")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    hosts = generate_hosts(args.hosts)
+    data_file = os.path.join(tmp_dir, 'data.yaml')
+    cache_dir = os.path.join(tmp_dir, 'cache')
+    warm_dir = os.path.join(tmp_dir, 'warm')
+    grouping = dict(GROUPING)
+
+    for i in range(args.groups):
+        grouping['uuid%03d' % i] = [{'vcenter.uuid': '~^%02x' % (i % 256)}]
+
+    def parse(source):
+        plugin = inventory_loader.get('yaml_list')
+        plugin.parse(InventoryData(), DataLoader(), source)
+        plugin.update_cache_if_changed()
+
+    def index():
+        # Rebuilds the stale index
+        if args.index:
+            subprocess.run(
+                [
+                    sys.executable,
+                    os.path.join(ROOT_DIR, 'yamllistctl.py'),
+                    '-x', '-f', data_file, 'search', hosts[0]['name'],
+                ],
+                stdout=subprocess.DEVNULL,
+                check=True)
+
+    def restore():
+        # Cache as left by the parsing of the original data file
+        shutil.rmtree(cache_dir)
+        shutil.copytree(warm_dir, cache_dir)
+
+    try:
+        print("%d hosts, %d grouping rules, %g%% changed, %s cache%s" % (
+            args.hosts, len(grouping), args.changed, args.cache_plugin,
+            ', index' if args.index else ''))
+
+        for incremental in (False, True):
+            source = os.path.join(tmp_dir, 'test.list.yaml')
+
+            with open(source, 'w') as f:
+                yaml.safe_dump({
+                    'plugin': 'yaml_list',
+                    'data_file': data_file,
+                    'accept': ACCEPT,
+                    'ignore': IGNORE,
+                    'grouping': grouping,
+                    'cache': True,
+                    'cache_plugin': args.cache_plugin,
+                    'cache_connection': cache_dir,
+                    'incremental': incremental,
+                }, f)
+
+            if os.path.exists(cache_dir):
+                shutil.rmtree(cache_dir)
+
+            write_data_file(hosts, data_file)
+            index()
+            parse(source)
+            shutil.copytree(cache_dir, warm_dir)
+
+            # Change every n-th host
+            changed = [dict(host) for host in hosts]
+            step = max(1, int(100 / args.changed))
+
+            for host in changed[::step]:
+                host['state'] = 'suspended'
+
+            write_data_file(changed, data_file)
+            index()
+
+            print("%-12s %8.3f s" % (
+                'incremental' if incremental else 'full',
+                timeit(lambda: parse(source), args.repeat, restore)))
+
+            shutil.rmtree(warm_dir)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import gc
+import os
+import time
+import tracemalloc
+
+from benchmarks.common import generate_hosts, get_plugin, write_data_file
+
+
+def measure(plugin, stream):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    if stream:
+        data = plugin._iter_data_file(plugin.get_option('data_file'))
+    else:
+        data = plugin._parse_data_file(plugin.get_option('data_file'))
+
+    entries = plugin._compute_entries(data)
+    elapsed = time.perf_counter() - start
+
+    del data
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return len(entries), elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Measure the peak memory of loading and filtering the data file "
+            "with and without streaming."))
+    parser.add_argument(
+        '-n', '--hosts',
+        type=int,
+        default=200000,
+        help="Number of hosts in the generated data file.")
+    args = parser.parse_args()
+
+    path = write_data_file(generate_hosts(args.hosts))
+
+    try:
+        print("%-8s %10s %10s %12s" % (
+            'mode', 'accepted', 'time [s]', 'peak [MB]'))
+
+        for stream in (False, True):
+            # Accept only ~5% of the hosts
+            plugin = get_plugin(
+                data_file=path,
+                stream=stream,
+                accept=[{'name': '~.*0[0-4]$'}])
+            accepted, elapsed, peak = measure(plugin, stream)
+
+            print("%-8s %10d %10.2f %12.1f" % (
+                'stream' if stream else 'full',
+                accepted,
+                elapsed,
+                peak / 1024.0 / 1024))
+    finally:
+        os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
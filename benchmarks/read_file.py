@@ -0,0 +1,50 @@
+import argparse
+import os
+
+from benchmarks.common import (
+    generate_hosts, get_plugin, timeit, write_data_file)
+
+
+def read_lines(path):
+    # The original implementation concatenating individual lines
+    content = ''
+
+    with open(path, 'r') as f:
+        for line in f.readlines():
+            content += line
+
+    return content
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare reading of the data file line by line and bulk.")
+    parser.add_argument(
+        '-n', '--hosts',
+        type=int,
+        default=50000,
+        help="Number of hosts in the generated data file.")
+    parser.add_argument(
+        '-r', '--repeat',
+        type=int,
+        default=5,
+        help="Number of runs (the best one is reported).")
+    args = parser.parse_args()
+
+    path = write_data_file(generate_hosts(args.hosts))
+    plugin = get_plugin(data_file=path)
+
+    try:
+        print("Data file: %d hosts, %.1f MB" % (
+            args.hosts, os.path.getsize(path) / 1024.0 / 1024))
+        print("%-8s %8.3f s" % (
+            'lines', timeit(lambda: read_lines(path), args.repeat)))
+        print("%-8s %8.3f s" % (
+            'bulk',
+            timeit(lambda: plugin._read_yaml_file(path), args.repeat)))
+    finally:
+        os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
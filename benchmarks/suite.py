@@ -0,0 +1,296 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import yaml
+from ansible import __version__ as ansible_version
+from ansible.inventory.data import InventoryData
+from ansible.parsing.dataloader import DataLoader
+from ansible.plugins.loader import inventory_loader
+
+from benchmarks.common import generate_hosts, timeit, write_data_file
+from yaml_list import SafeLoader
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIGS_DIR = os.path.join(ROOT_DIR, 'benchmarks', 'configs')
+CTL = os.path.join(ROOT_DIR, 'yamllistctl.py')
+
+
+inventory_loader.add_directory(ROOT_DIR)
+
+
+def get_configs(names):
+    # Returns paths of the configs given by name or path (all by default)
+    if not names:
+        return sorted(glob.glob(os.path.join(CONFIGS_DIR, '*.list.yaml')))
+
+    paths = []
+
+    for name in names:
+        if not os.path.exists(name):
+            name = os.path.join(CONFIGS_DIR, '%s.list.yaml' % name)
+
+        paths.append(name)
+
+    return paths
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=ROOT_DIR,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_source(config_path, data_file, stats_file, tmp_dir):
+    # Writes copy of the config pointing to the generated data file and
+    # writing the statistics
+    with open(config_path) as f:
+        config = yaml.safe_load(f)
+
+    config['data_file'] = data_file
+    config['stats_file'] = stats_file
+    source = os.path.join(tmp_dir, os.path.basename(config_path))
+
+    with open(source, 'w') as f:
+        yaml.safe_dump(config, f)
+
+    return source
+
+
+def bench_parse(source, stats_file, repeat):
+    # Times the stages of the parsing of the inventory source by the
+    # statistics of the plugin
+    best = {}
+    accepted = 0
+
+    for _ in range(repeat):
+        if os.path.exists(stats_file):
+            os.unlink(stats_file)
+
+        plugin = inventory_loader.get('yaml_list')
+        plugin.parse(InventoryData(), DataLoader(), source, cache=False)
+
+        with open(stats_file) as f:
+            stats = json.loads(f.readline())
+
+        for phase, elapsed in stats['phases'].items():
+            if phase not in best or elapsed < best[phase]:
+                best[phase] = elapsed
+
+        accepted = stats['counters']['accepted']
+
+    return accepted, best
+
+
+def bench_ctl(hosts, data_file, tmp_dir, repeat):
+    # Times the yamllistctl actions including the start of the interpreter
+    pristine = os.path.join(tmp_dir, 'pristine.yaml')
+    shutil.copyfile(data_file, pristine)
+
+    host = hosts[len(hosts) // 2]['name']
+    new_host = 'bench-new-host'
+    batch_file = os.path.join(tmp_dir, 'batch.jsonl')
+
+    with open(batch_file, 'w') as f:
+        for h in hosts[::max(1, len(hosts) // 100)][:100]:
+            f.write("%s\n" % json.dumps({
+                'action': 'set',
+                'host': h['name'],
+                'path': 'vcenter.guest_id',
+                'value': 'rhel7_64Guest',
+            }))
+
+        for i in range(10):
+            f.write("%s\n" % json.dumps({
+                'action': 'add',
+                'host': '%s%02d' % (new_host, i),
+                'group': 'web',
+            }))
+
+    def run(*args):
+        subprocess.run(
+            [sys.executable, CTL, '-f', data_file] + list(args),
+            stdout=subprocess.DEVNULL,
+            check=True)
+
+    def restore():
+        shutil.copyfile(pristine, data_file)
+
+        if os.path.exists('%s.idx' % data_file):
+            os.unlink('%s.idx' % data_file)
+
+    def restore_indexed():
+        restore()
+        run('-x', 'search', host)
+
+    actions = [
+        ('startup', ['--help'], restore),
+        ('search', ['search', host], restore),
+        ('search_index', ['-x', 'search', host], restore_indexed),
+        ('add', ['add', new_host, '10.255.255.1', 'web'], restore),
+        ('add_in_place', ['-i', 'add', new_host, '10.255.255.1'], restore),
+        ('set', ['set', host, 'vcenter.guest_id', 'rhel7_64Guest'], restore),
+        (
+            'set_in_place',
+            ['-i', 'set', host, 'vcenter.guest_id', 'rhel7_64Guest'],
+            restore),
+        ('remove', ['remove', host], restore),
+        ('remove_in_place', ['-i', 'remove', host], restore),
+        ('batch', ['batch', batch_file], restore),
+    ]
+    results = {}
+
+    for name, args, setup in actions:
+        results[name] = timeit(lambda: run(*args), repeat, setup)
+
+    restore()
+
+    return results
+
+
+def compare(results, base_path):
+    with open(base_path) as f:
+        base = json.load(f)
+
+    print("\nCompared with %s (commit %s)" % (
+        base_path, base['meta']['commit']))
+    print("%-40s %10s %10s %8s" % ('benchmark', 'base', 'current', 'ratio'))
+
+    for key in sorted(set(results) & set(base['results'])):
+        print("%-40s %10.4f %10.4f %8.2f" % (
+            key,
+            base['results'][key],
+            results[key],
+            results[key] / base['results'][key]
+            if base['results'][key] else float('inf')))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Time the stages of the parsing of the inventory sources and the "
+            "yamllistctl actions on generated data files."))
+    parser.add_argument(
+        '-n', '--hosts',
+        type=int,
+        nargs='+',
+        default=[1000, 10000],
+        help="Numbers of hosts in the generated data files.")
+    parser.add_argument(
+        '-c', '--configs',
+        nargs='+',
+        help=(
+            "Names of the configs from the benchmarks/configs directory or "
+            "paths to other configs (default: all)."))
+    parser.add_argument(
+        '--depth',
+        type=int,
+        default=3,
+        help="Nesting depth of the 'meta' key of the hosts.")
+    parser.add_argument(
+        '--fanout',
+        type=int,
+        default=3,
+        help="Number of groups of the grouped hosts.")
+    parser.add_argument(
+        '--lists',
+        type=int,
+        default=3,
+        help="Number of items of the list-valued keys.")
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help="Seed of the generator.")
+    parser.add_argument(
+        '--no-ctl',
+        action='store_true',
+        help="Don't time the yamllistctl actions.")
+    parser.add_argument(
+        '-r', '--repeat',
+        type=int,
+        default=3,
+        help="Number of runs (the best one is reported).")
+    parser.add_argument(
+        '-o', '--output',
+        help="Write the results into the JSON file.")
+    parser.add_argument(
+        '--compare',
+        metavar='JSON',
+        help="Compare the results with the previously written JSON file.")
+    args = parser.parse_args()
+
+    configs = get_configs(args.configs)
+    results = {}
+    tmp_dir = tempfile.mkdtemp()
+
+    try:
+        for count in args.hosts:
+            hosts = generate_hosts(
+                count, args.seed, args.depth, args.fanout, args.lists)
+            data_file = write_data_file(
+                hosts, os.path.join(tmp_dir, 'data.yaml'))
+
+            print("Data file: %d hosts, %.1f MB" % (
+                count, os.path.getsize(data_file) / 1024.0 / 1024))
+
+            for config_path in configs:
+                name = os.path.basename(config_path)[:-len('.list.yaml')]
+                stats_file = os.path.join(tmp_dir, 'stats.json')
+                source = write_source(
+                    config_path, data_file, stats_file, tmp_dir)
+                accepted, stages = bench_parse(
+                    source, stats_file, args.repeat)
+
+                print("  %s (%d hosts accepted)" % (name, accepted))
+
+                for stage, elapsed in sorted(stages.items()):
+                    print("    %-16s %8.4f s" % (stage, elapsed))
+                    results['%s/%d/%s' % (name, count, stage)] = elapsed
+
+            if not args.no_ctl:
+                print("  yamllistctl")
+
+                for action, elapsed in bench_ctl(
+                        hosts, data_file, tmp_dir, args.repeat).items():
+                    print("    %-16s %8.4f s" % (action, elapsed))
+                    results['yamllistctl/%d/%s' % (count, action)] = elapsed
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'meta': {
+                    'commit': get_commit(),
+                    'python': platform.python_version(),
+                    'ansible': ansible_version,
+                    'yaml_loader': SafeLoader.__name__,
+                    'generator': {
+                        'depth': args.depth,
+                        'fanout': args.fanout,
+                        'lists': args.lists,
+                        'seed': args.seed,
+                    },
+                    'repeat': args.repeat,
+                },
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
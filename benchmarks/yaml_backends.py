@@ -0,0 +1,46 @@
+import argparse
+import os
+import yaml
+
+from benchmarks.common import generate_hosts, timeit, write_data_file
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the load time of the PyYAML backends.")
+    parser.add_argument(
+        '-n', '--hosts',
+        type=int,
+        default=100000,
+        help="Number of hosts in the generated data file.")
+    parser.add_argument(
+        '-r', '--repeat',
+        type=int,
+        default=1,
+        help="Number of runs (the best one is reported).")
+    args = parser.parse_args()
+
+    path = write_data_file(generate_hosts(args.hosts))
+    loaders = [yaml.SafeLoader]
+
+    if yaml.__with_libyaml__:
+        loaders.append(yaml.CSafeLoader)
+
+    print("Data file: %d hosts, %.1f MB" % (
+        args.hosts, os.path.getsize(path) / 1024.0 / 1024))
+
+    try:
+        with open(path) as f:
+            content = f.read()
+
+        for loader in loaders:
+            elapsed = timeit(
+                lambda: yaml.load(content, Loader=loader), args.repeat)
+
+            print("%-14s %8.3f s" % (loader.__name__, elapsed))
+    finally:
+        os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,7 @@ import os
 import unittest
 import yaml
 from ansible import constants as C
+from ansible.errors import AnsibleParserError
 from yaml_list import InventoryModule
 
 
@@ -383,6 +384,156 @@ class Test(MyTestCase):
                     accept=t['accept'],
                     expected=t['expected'])
 
+    def test_invalid_regexp(self):
+        im = MyInventoryModule()
+
+        with self.assertRaises(AnsibleParserError):
+            im._compile_conditions([{'name': '~test('}])
+
+    def test_regexp_reuse(self):
+        im = MyInventoryModule()
+        program = im._compile_conditions([
+            {
+                'name': '~^test',
+                'state': '!~^test',
+            }, {
+                'name': ['~^test', '!~^test'],
+            }
+        ])
+
+        self.assertEqual(im._pattern_stats['compiles'], 1)
+        self.assertEqual(im._pattern_stats['hits'], 3)
+        self.assertTrue(im._match_conditions(
+            {'name': 'test1', 'state': 'prod'}, program))
+
+    def test_key_memo(self):
+        im = MyInventoryModule()
+        host = {
+            'name': 'test1',
+            'vcenter': {
+                'tags': ['a', 'b'],
+            },
+        }
+        memo = {}
+
+        for conditions, result in [
+                ([{'vcenter.tags[1]': 'b'}], True),
+                ([{'vcenter.tags[1]': 'a'}], False),
+                ([{'vcenter.tags[1]': '~^b$', 'name': 'test1'}], True)]:
+            self.assertEqual(
+                im._match_conditions(
+                    host, im._compile_conditions(conditions), memo=memo),
+                result)
+
+        self.assertEqual(im._path_stats['walks'], 2)
+        self.assertEqual(im._path_stats['hits'], 2)
+
+    def test_encode_ids(self):
+        im = MyInventoryModule()
+
+        for ids, size in [
+                ([], 0),
+                ([], 5),
+                ([0], 1),
+                ([0, 2, 3], 4),
+                ([1, 64, 99], 100)]:
+            self.assertEqual(im._decode_ids(im._encode_ids(ids, size)), ids)
+
+    def test_grouping_index(self):
+        hosts = [
+            {
+                'name': 'test1',
+                'state': 'poweredOn',
+                'tags': ['a', 'b'],
+            }, {
+                'name': 'test2',
+                'state': 'poweredOff',
+                'tags': 'a',
+            }, {
+                'name': 'test3',
+                'state': None,
+                'tags': [],
+            }, {
+                'name': 'test4',
+                'tags': {'a': 'b'},
+            },
+        ]
+        im = MyInventoryModule()
+        grouping = [
+            (group, im._compile_conditions(conditions))
+            for group, conditions in (
+                ('on', [{'state': 'poweredOn'}]),
+                ('a', [{'tags': 'a'}]),
+                ('b', [{'tags': 'b'}]),
+                ('on_a', [{'state': 'poweredOn', 'tags': 'a'}]),
+                ('off_or_a', [{'state': 'poweredOff'}, {'tags': 'a'}]),
+                ('not_a', [{'tags': '!a'}]),
+                ('none', [{'state': None}]),
+            )]
+
+        self.assertEqual(
+            [im._is_indexable(program) for group, program in grouping],
+            [True, True, True, True, True, False, False])
+        self.assertEqual(
+            im._match_grouping(hosts, grouping),
+            [
+                [
+                    group for group, program in grouping
+                    if im._match_conditions(host, program)
+                ]
+                for host in hosts
+            ])
+
+    def test_bulk(self):
+        hosts = [
+            {
+                'name': 'test1',
+                'state': 'poweredOn',
+                'tags': ['a', 'b'],
+            }, {
+                'name': 'test2',
+                'state': 'poweredOff',
+                'tags': 'a',
+            }, {
+                'name': 'test3',
+                'state': None,
+                'tags': [],
+            }, {
+                'name': 'test4',
+            },
+        ]
+        conditions = [
+            [],
+            [{}],
+            [{'state': 'poweredOn'}],
+            [{'state': '~^powered'}],
+            [{'state': '!poweredOn'}],
+            [{'state': '!~.*On$'}],
+            [{'state': None}],
+            [{'state': ['poweredOn', '!poweredOff']}],
+            [{'tags': 'a'}],
+            [{'tags': '!a'}],
+            [{'tags': ['a', 'b']}],
+            [{'_state': 'poweredOff', 'tags': 'a'}],
+            [{'tags': 'a', '_state': 'poweredOff'}],
+            [{'name': 'test4'}, {'tags': '!b'}],
+        ]
+        im = MyInventoryModule()
+        columns = {}
+
+        for i, c in enumerate(conditions):
+            program = im._compile_conditions(c)
+
+            for default in (True, False):
+                with self.subTest(i=i, default=default):
+                    self.assertEqual(
+                        im._match_conditions_bulk(
+                            hosts, program, columns, default),
+                        [
+                            im._match_conditions(host, program, default)
+                            for host in hosts
+                        ])
+
     def test_real(self):
         if not self._getenvbool('DEBUG', False):
             self.skipTest("No DEBUG defined.")
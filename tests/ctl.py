@@ -0,0 +1,347 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+import yaml
+
+
+CTL = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'yamllistctl.py')
+
+
+class MyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.data_file = os.path.join(self.tmp_dir, 'data.yaml')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _write(self, data):
+        with open(self.data_file, 'w') as f:
+            yaml.safe_dump(data, f)
+
+    def _read(self):
+        with open(self.data_file) as f:
+            return yaml.safe_load(f)
+
+    def _run(self, *args, **kwargs):
+        return subprocess.run(
+            [sys.executable, CTL, '-f', self.data_file] + list(args),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            **kwargs)
+
+
+class Test(MyTestCase):
+    def test_actions(self):
+        self._write([
+            {'name': 'host1', 'ip': '1.1.1.1'},
+            {'name': 'host2'},
+            {'name': 'host1', 'ip': '2.2.2.2'},
+        ])
+
+        # The first definition wins
+        self.assertEqual(
+            yaml.safe_load(self._run('search', 'host1').stdout),
+            [{'name': 'host1', 'ip': '1.1.1.1'}])
+
+        self.assertEqual(self._run('set', 'host2', 'a.b', '1').returncode, 0)
+        self.assertEqual(self._run('add', 'host3', '3.3.3.3').returncode, 0)
+        self.assertEqual(self._run('remove', 'host1').returncode, 0)
+
+        self.assertEqual(self._read(), [
+            {'name': 'host2', 'a': {'b': 1}},
+            {'name': 'host1', 'ip': '2.2.2.2'},
+            {
+                'name': 'host3',
+                'ip': '3.3.3.3',
+                'ansible': {'override_ungrouped': True},
+            },
+        ])
+
+        # The other definition becomes visible after the removal
+        self.assertEqual(
+            yaml.safe_load(self._run('search', 'host1').stdout),
+            [{'name': 'host1', 'ip': '2.2.2.2'}])
+        self.assertEqual(self._run('set', 'host4', 'a', '1').returncode, 127)
+
+    def test_write(self):
+        self._write([{'name': 'host1'}])
+        os.chmod(self.data_file, 0o640)
+
+        with open(self.data_file) as f:
+            content = f.read()
+
+        link = os.path.join(self.tmp_dir, 'link.yaml')
+        os.symlink(self.data_file, link)
+
+        result = self._run('-b', 'add', 'host2')
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(
+            [h['name'] for h in self._read()], ['host1', 'host2'])
+        self.assertEqual(
+            oct(os.stat(self.data_file).st_mode & 0o777), oct(0o640))
+
+        with open('%s.bak' % self.data_file) as f:
+            self.assertEqual(f.read(), content)
+
+        # Symlink must stay a symlink
+        result = subprocess.run(
+            [sys.executable, CTL, '-f', link, 'remove', 'host1'])
+        self.assertEqual(result.returncode, 0)
+        self.assertTrue(os.path.islink(link))
+        self.assertEqual([h['name'] for h in self._read()], ['host2'])
+
+        # No temporary files must be left behind
+        self.assertEqual(
+            sorted(os.listdir(self.tmp_dir)),
+            ['data.yaml', 'data.yaml.bak', 'data.yaml.lock', 'link.yaml'])
+
+    def test_in_place(self):
+        content = (
+            "---\n"
+            "# Hosts\n"
+            "- name: host1  # first\n"
+            "  ip: 1.1.1.1\n"
+            "\n"
+            "# Second host\n"
+            "-   name: host2\n"
+            "    tags: [a, b]\n"
+            "- name: host3\n"
+            "  note: |\n"
+            "    text\n"
+            "\n"
+            "# End\n")
+
+        with open(self.data_file, 'w') as f:
+            f.write(content)
+
+        for args in [
+                ('set', 'host2', 'tags[1]', 'c'),
+                ('add', 'host4', '4.4.4.4'),
+                ('remove', 'host3'),
+                # Unchanged host must not be rewritten
+                ('add', 'host1', '1.1.1.1')]:
+            self.assertEqual(self._run('-i', *args).returncode, 0)
+
+        with open(self.data_file) as f:
+            self.assertEqual(f.read(), (
+                "---\n"
+                "# Hosts\n"
+                "- name: host1  # first\n"
+                "  ip: 1.1.1.1\n"
+                "\n"
+                "# Second host\n"
+                "- name: host2\n"
+                "  tags:\n"
+                "    - a\n"
+                "    - c\n"
+                "- ansible:\n"
+                "    override_ungrouped: true\n"
+                "  ip: 4.4.4.4\n"
+                "  name: host4\n"
+                "\n"
+                "# End\n"))
+
+    def test_in_place_leading_comments(self):
+        for header in ("", "# Header\n---\n", "%YAML 1.1\n--- # Hosts\n"):
+            with self.subTest(header=header):
+                with open(self.data_file, 'w') as f:
+                    f.write(
+                        header +
+                        "# host a\n"
+                        "- name: a\n"
+                        "# host b\n"
+                        "- name: b\n")
+
+                # First host owns its comments like any other
+                self.assertEqual(
+                    self._run('-i', 'remove', 'a').returncode, 0)
+
+                with open(self.data_file) as f:
+                    self.assertEqual(
+                        f.read(), header + "# host b\n- name: b\n")
+
+    def test_in_place_rename(self):
+        with open(self.data_file, 'w') as f:
+            f.write(
+                "- name: host1  # first\n"
+                "- name: host2\n")
+
+        # Renamed host must be rewritten
+        self.assertEqual(
+            self._run('-i', 'set', 'host1', 'name', 'host9').returncode, 0)
+
+        with open(self.data_file) as f:
+            self.assertEqual(f.read(), (
+                "- name: host9\n"
+                "- name: host2\n"))
+
+    def test_index(self):
+        self._write([
+            {'name': 'host%d' % i, 'ip': '1.1.1.%d' % i} for i in range(5)])
+
+        def search(host):
+            result = self._run('-d', '-x', 'search', host)
+            self.assertEqual(result.returncode, 0)
+
+            return (
+                yaml.safe_load(result.stdout),
+                'Searching for host in the index' in result.stderr)
+
+        # Missing index is built
+        self.assertEqual(
+            search('host1'), ([{'name': 'host1', 'ip': '1.1.1.1'}], False))
+        self.assertTrue(os.path.exists('%s.idx' % self.data_file))
+        self.assertEqual(
+            search('host3'), ([{'name': 'host3', 'ip': '1.1.1.3'}], True))
+        self.assertEqual(search('host9'), (None, True))
+
+        # Index is updated by the write
+        self.assertEqual(self._run('-x', 'remove', 'host0').returncode, 0)
+        self.assertEqual(
+            search('host4'), ([{'name': 'host4', 'ip': '1.1.1.4'}], True))
+
+        # Stale index is rebuilt
+        self.assertEqual(self._run('add', 'host5').returncode, 0)
+        self.assertEqual(search('host5')[1], False)
+        self.assertEqual(search('host5')[1], True)
+
+    def test_concurrent_writers(self):
+        self._write([{'name': 'host0'}])
+
+        for mode in ([], ['--cas', '--cas-retries', '100']):
+            with self.subTest(mode=mode):
+                processes = [
+                    subprocess.Popen(
+                        [
+                            sys.executable, CTL, '-f', self.data_file
+                        ] + mode + [
+                            'add', '%s%d' % ('cas' if mode else 'lock', i)
+                        ],
+                        stderr=subprocess.PIPE)
+                    for i in range(8)]
+
+                for p in processes:
+                    p.communicate()
+                    self.assertEqual(p.returncode, 0)
+
+        # No update must be lost
+        self.assertEqual(
+            sorted(h['name'] for h in self._read()),
+            sorted(
+                ['host0'] +
+                ['lock%d' % i for i in range(8)] +
+                ['cas%d' % i for i in range(8)]))
+
+    def test_batch(self):
+        self._write([
+            {'name': 'host1'},
+            {'name': 'host2'},
+        ])
+        ops = [
+            {'action': 'remove', 'host': 'host1'},
+            {'action': 'add', 'host': 'host3', 'override_ungrouped': 'no'},
+            {'action': 'set', 'host': 'host2', 'path': 'a.b', 'value': [1]},
+            # Failed operation must not change the host
+            {'action': 'set', 'host': 'host3', 'path': 'x.y[0]', 'value': 1},
+            {'action': 'unknown'},
+            {'action': 'set', 'host': 'host3', 'path': 'ip', 'value': 'ip3'},
+        ]
+
+        result = self._run(
+            'batch', input=yaml.safe_dump_all([ops[:3], ops[3], ops[4:]]))
+
+        self.assertEqual(result.returncode, 1)
+        self.assertEqual(
+            [line.split()[1] for line in result.stdout.splitlines()],
+            ['ok', 'ok', 'ok', 'error(127)', 'error(1)', 'ok'])
+        self.assertEqual(self._read(), [
+            {'name': 'host2', 'a': {'b': [1]}},
+            {'name': 'host3', 'ip': 'ip3'},
+        ])
+
+        # Operations following the failed one are not applied
+        result = self._run(
+            'batch', '--stop-on-error',
+            input='\n'.join(json.dumps(op) for op in ops[3:]))
+
+        self.assertEqual(result.returncode, 1)
+        self.assertEqual(len(result.stdout.splitlines()), 1)
+        self.assertEqual(self._read()[1], {'name': 'host3', 'ip': 'ip3'})
+
+        # Statuses must not be mixed with the printed YAML
+        result = self._run(
+            '-s', 'batch',
+            input=json.dumps({'action': 'remove', 'host': 'host2'}))
+
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(
+            yaml.safe_load(result.stdout), [{'name': 'host3', 'ip': 'ip3'}])
+        self.assertEqual(result.stderr, "1 ok remove host2\n")
+
+        # Operation with invalid arguments must fail alone
+        result = self._run(
+            '-s', 'batch',
+            input='\n'.join(json.dumps(op) for op in [
+                {'action': 'set', 'host': 'host2', 'path': 5, 'value': 1},
+                {'action': 'remove', 'host': ['host2']},
+                {'action': 'remove', 'host': 'host2'},
+            ]))
+
+        self.assertEqual(result.returncode, 1)
+        self.assertEqual(
+            yaml.safe_load(result.stdout), [{'name': 'host3', 'ip': 'ip3'}])
+        self.assertEqual(
+            [
+                line.split()[1] for line in result.stderr.splitlines()
+                if not line.startswith('ERROR')],
+            ['error(1)', 'error(1)', 'ok'])
+
+    def test_batch_rename(self):
+        self._write([{'name': 'c', 'ip': '1.1.1.1'}])
+
+        result = self._run(
+            'batch',
+            input='\n'.join(json.dumps(op) for op in [
+                {'action': 'set', 'host': 'c', 'path': 'name', 'value': 'cc'},
+                {
+                    'action': 'add', 'host': 'c', 'ip': '9.9.9.9',
+                    'override_ungrouped': 'no'},
+                {'action': 'set', 'host': 'cc', 'path': 'x', 'value': 1},
+            ]))
+
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(self._read(), [
+            {'name': 'cc', 'ip': '1.1.1.1', 'x': 1},
+            {'name': 'c', 'ip': '9.9.9.9'},
+        ])
+
+        # Another definition of the old name becomes visible and the renamed
+        # host precedes the existing definition of the new name
+        self._write([{'name': 'a'}, {'name': 'b'}, {'name': 'a', 'ip': '2'}])
+
+        result = self._run(
+            'batch',
+            input='\n'.join(json.dumps(op) for op in [
+                {'action': 'set', 'host': 'a', 'path': 'name', 'value': 'b'},
+                {'action': 'set', 'host': 'a', 'path': 'x', 'value': 1},
+                {'action': 'set', 'host': 'b', 'path': 'y', 'value': 2},
+            ]))
+
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(self._read(), [
+            {'name': 'b', 'y': 2},
+            {'name': 'b'},
+            {'name': 'a', 'ip': '2', 'x': 1},
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
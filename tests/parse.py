@@ -0,0 +1,706 @@
+import datetime
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+import yaml
+from ansible import context
+from ansible.errors import AnsibleParserError
+from ansible.inventory.data import InventoryData
+from ansible.parsing.dataloader import DataLoader
+from ansible.plugins.loader import inventory_loader
+from ansible.utils.context_objects import CLIArgs
+
+
+inventory_loader.add_directory(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class MyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _write_yaml(self, name, data):
+        path = os.path.join(self.tmp_dir, name)
+
+        with open(path, 'w') as f:
+            yaml.safe_dump(data, f)
+
+        return path
+
+    def _write_source(self, name, data_file, **options):
+        config = {
+            'plugin': 'yaml_list',
+            'data_file': data_file,
+        }
+        config.update(options)
+
+        return self._write_yaml(name, config)
+
+    def _parse(self, sources, inventory=None, cache=True):
+        if inventory is None:
+            inventory = InventoryData()
+
+        for source in sources:
+            plugin = inventory_loader.get('yaml_list')
+            plugin.parse(inventory, DataLoader(), source, cache=cache)
+
+            try:
+                plugin.update_cache_if_changed()
+            except AttributeError:
+                # Cache is not enabled
+                pass
+
+        return inventory
+
+    def _groups(self, inventory):
+        return dict(
+            (name, [h.name for h in group.get_hosts()])
+            for name, group in inventory.groups.items()
+            if name not in ('all', 'ungrouped'))
+
+
+class Test(MyTestCase):
+    def test_parse(self):
+        data_file = self._write_yaml('data.yaml', [
+            {
+                'name': 'host1',
+                'ip': '192.168.1.1',
+                'ansible': {
+                    'group': ['web', 'db'],
+                    'ansible_user': 'user1',
+                },
+            }, {
+                'name': 'host2',
+                'vcenter': {
+                    'guest_id': 'windows8Server64Guest',
+                },
+            }, {
+                'name': 'host3',
+                'state': 'poweredOff',
+            },
+        ])
+        source = self._write_source(
+            'test.list.yaml', data_file,
+            ignore=[{'state': 'poweredOff'}],
+            grouping={'windows': [{'vcenter.guest_id': '~win'}]},
+            vars={'type': 'vm'})
+
+        inventory = self._parse([source])
+
+        self.assertEqual(self._groups(inventory), {
+            'web': ['host1'],
+            'db': ['host1'],
+            'ungrouped_hosts': ['host2'],
+            'windows': ['host2'],
+        })
+
+        host1 = inventory.hosts['host1'].vars
+
+        self.assertEqual(host1['ansible_host'], '192.168.1.1')
+        self.assertEqual(host1['ansible_user'], 'user1')
+        self.assertEqual(host1['yaml_list']['type'], 'vm')
+        self.assertNotIn('host3', inventory.hosts)
+
+    def test_invalid_condition(self):
+        # The missing data file must not be read
+        source = self._write_source(
+            'test.list.yaml', os.path.join(self.tmp_dir, 'missing.yaml'),
+            grouping={'bad': [{'state': '~[a-'}]})
+
+        with self.assertRaisesRegex(
+                AnsibleParserError, 'Invalid regular expression'):
+            self._parse([source])
+
+    def test_multiple_sources(self):
+        data_file1 = self._write_yaml('data1.yaml', [
+            {
+                'name': 'host1',
+                'ansible': {
+                    'group': 'web',
+                },
+            },
+        ])
+        data_file2 = self._write_yaml('data2.yaml', [
+            {
+                'name': 'host2',
+                'ansible': {
+                    'group': 'web',
+                },
+            },
+        ])
+        source1 = self._write_source('test1.list.yaml', data_file1)
+        source2 = self._write_source('test2.list.yaml', data_file2)
+
+        # Each source must create its groups in its own inventory
+        self.assertEqual(
+            self._groups(self._parse([source1])), {'web': ['host1']})
+        self.assertEqual(
+            self._groups(self._parse([source2])), {'web': ['host2']})
+
+        # Sources sharing the same inventory
+        self.assertEqual(
+            self._groups(self._parse([source1, source2])),
+            {'web': ['host1', 'host2']})
+
+    def test_stream(self):
+        data_file = self._write_yaml('data.yaml', [
+            {
+                'name': 'host%d' % i,
+                'state': 'poweredOn' if i % 3 else 'poweredOff',
+                'ansible': {
+                    'group': 'group%d' % (i % 2),
+                },
+            }
+            for i in range(10)
+        ])
+        options = {
+            'ignore': [{'state': 'poweredOff'}],
+            'grouping': {'even': [{'ansible.group': 'group0'}]},
+        }
+        source = self._write_source('test.list.yaml', data_file, **options)
+        stream_source = self._write_source(
+            'stream.list.yaml', data_file, stream=True, **options)
+
+        inventory = self._parse([source])
+        stream_inventory = self._parse([stream_source])
+
+        self.assertEqual(
+            self._groups(stream_inventory), self._groups(inventory))
+        self.assertEqual(
+            dict((h, v.vars['yaml_list']) for h, v in inventory.hosts.items()),
+            dict(
+                (h, v.vars['yaml_list'])
+                for h, v in stream_inventory.hosts.items()))
+
+        # Empty data file
+        with open(data_file, 'w') as f:
+            f.write('---\n')
+
+        self.assertEqual(list(self._parse([stream_source]).hosts), [])
+
+    def test_preload(self):
+        sources = []
+
+        for i in range(4):
+            data_file = self._write_yaml('data%d.yaml' % i, [
+                {
+                    'name': 'host%d_%d' % (i, j),
+                    'state': 'poweredOn' if j % 2 else 'poweredOff',
+                }
+                for j in range(5)
+            ])
+            sources.append(self._write_source(
+                'test%d.list.yaml' % i, data_file,
+                preload=True,
+                workers=2,
+                grouping={'on': [{'state': 'poweredOn'}]}))
+
+        plugin_class = type(inventory_loader.get('yaml_list'))
+        inventory = self._parse(sources)
+
+        self.assertEqual(plugin_class._preloaded, {})
+        self.assertEqual(
+            sorted(self._groups(inventory)['on']),
+            sorted(
+                'host%d_%d' % (i, j) for i in range(4) for j in (1, 3)))
+
+        # Failed source must be reported when it's parsed
+        with open(os.path.join(self.tmp_dir, 'data2.yaml'), 'w') as f:
+            f.write('- name: [\n')
+
+        self.assertRaises(AnsibleParserError, self._parse, sources)
+        self.assertNotIn(sources[2], plugin_class._preloaded)
+        self.assertIn(sources[3], plugin_class._preloaded)
+
+        # Sources which were not parsed are dropped by the next preload
+        other_dir = os.path.join(self.tmp_dir, 'other')
+        os.mkdir(other_dir)
+        other_source = os.path.join(other_dir, 'test.list.yaml')
+        shutil.copy(sources[0], other_source)
+
+        self.assertEqual(list(self._parse([other_source]).hosts), [
+            'host0_%d' % j for j in range(5)])
+        self.assertEqual(plugin_class._preloaded, {})
+
+    def test_parallel(self):
+        data_file = self._write_yaml('data.yaml', [
+            {
+                'name': 'host%d' % (i % 40),
+                'state': 'poweredOn' if i % 3 else 'poweredOff',
+                'tags': ['tag%d' % (i % 4), 'tag%d' % (i % 5)],
+                'ansible': {
+                    'group': 'group%d' % (i % 2),
+                },
+            }
+            for i in range(50)
+        ])
+        options = {
+            'ignore': [{'state': 'poweredOff'}],
+            'grouping': {
+                'even': [{'ansible.group': 'group0'}],
+                'tag1': [{'tags': 'tag1'}],
+                'tag2': [{'tags': '~tag2'}],
+            },
+        }
+        source = self._write_source('test.list.yaml', data_file, **options)
+        parallel_source = self._write_source(
+            'parallel.list.yaml', data_file,
+            parallel=True,
+            parallel_threshold=10,
+            workers=2,
+            bulk_threshold=5,
+            **options)
+
+        inventory = self._parse([source])
+        parallel_inventory = self._parse([parallel_source])
+
+        self.assertEqual(
+            self._groups(parallel_inventory), self._groups(inventory))
+        self.assertEqual(
+            dict((h, v.vars['yaml_list']) for h, v in inventory.hosts.items()),
+            dict(
+                (h, v.vars['yaml_list'])
+                for h, v in parallel_inventory.hosts.items()))
+
+    def test_incremental(self):
+        cache_dir = os.path.join(self.tmp_dir, 'cache')
+        data = [
+            {
+                'name': 'host%d' % i,
+                'state': 'poweredOn' if i % 3 else 'poweredOff',
+            }
+            for i in range(10)
+        ]
+        data_file = self._write_yaml('data.yaml', data)
+        options = {
+            'ignore': [{'state': 'poweredOff'}],
+            'grouping': {'on': [{'state': 'poweredOn'}]},
+        }
+        source = self._write_source(
+            'test.list.yaml', data_file,
+            cache=True,
+            cache_plugin='jsonfile',
+            cache_connection=cache_dir,
+            incremental=True,
+            **options)
+        full_source = self._write_source(
+            'full.list.yaml', data_file, **options)
+
+        plugin_class = type(inventory_loader.get('yaml_list'))
+        compute_entries = plugin_class._compute_entries
+        computed = []
+
+        def _compute_entries(plugin, data, record_ids=None):
+            computed.append(len(data))
+
+            return compute_entries(plugin, data, record_ids)
+
+        with mock.patch.object(
+                plugin_class, '_compute_entries', _compute_entries):
+            self._parse([source])
+            self.assertEqual(computed, [10])
+
+            # Only the changed and added records must be evaluated
+            data[0]['state'] = 'poweredOn'
+            data[1]['state'] = 'poweredOff'
+            data.append({'name': 'host10', 'state': 'poweredOn'})
+            del data[5]
+            self._write_yaml('data.yaml', data)
+
+            inventory = self._parse([source])
+            self.assertEqual(computed, [10, 3])
+
+            # Same value of different type must be evaluated again
+            data[2]['state'] = '2020-01-01'
+            self._write_yaml('data.yaml', data)
+            self._parse([source])
+
+            data[2]['state'] = datetime.date(2020, 1, 1)
+            self._write_yaml('data.yaml', data)
+
+            inventory = self._parse([source])
+            self.assertEqual(computed, [10, 3, 1, 1])
+
+            # Ampersand in a value is not an anchor
+            data[3]['notes'] = 'R&D'
+            self._write_yaml('data.yaml', data)
+
+            inventory = self._parse([source])
+            self.assertEqual(computed, [10, 3, 1, 1, 1])
+
+        full_inventory = self._parse([full_source])
+
+        self.assertEqual(self._groups(inventory), self._groups(full_inventory))
+        self.assertEqual(list(inventory.hosts), list(full_inventory.hosts))
+
+    def test_incremental_anchors(self):
+        data_file = os.path.join(self.tmp_dir, 'data.yaml')
+        source = self._write_source(
+            'test.list.yaml', data_file,
+            cache=True,
+            cache_plugin='jsonfile',
+            cache_connection=os.path.join(self.tmp_dir, 'cache'),
+            incremental=True,
+            ignore=[{'state': 'poweredOff'}],
+            grouping={'on': [{'state': 'poweredOn'}]})
+        content = (
+            "- name: host1\n"
+            "  state: &state poweredOn\n"
+            "- name: host2\n"
+            "  state: *state\n"
+            "- name: host3\n"
+            "  state: poweredOn\n")
+
+        with open(data_file, 'w') as f:
+            f.write(content)
+
+        inventory = self._parse([source])
+        self.assertEqual(
+            self._groups(inventory)['on'], ['host1', 'host2', 'host3'])
+
+        # The unchanged text of the second host aliases the changed value
+        with open(data_file, 'w') as f:
+            f.write(content.replace('poweredOn', 'poweredOff', 1))
+
+        inventory = self._parse([source])
+        self.assertEqual(list(inventory.hosts), ['host3'])
+
+    def test_incremental_index(self):
+        data_file = self._write_yaml('data.yaml', [
+            {
+                'name': 'host%d' % i,
+                'state': 'poweredOn' if i % 3 else 'poweredOff',
+            }
+            for i in range(10)
+        ])
+        options = {
+            'ignore': [{'state': 'poweredOff'}],
+            'grouping': {'on': [{'state': 'poweredOn'}]},
+        }
+        source = self._write_source(
+            'test.list.yaml', data_file,
+            cache=True,
+            cache_plugin='jsonfile',
+            cache_connection=os.path.join(self.tmp_dir, 'cache'),
+            incremental=True,
+            **options)
+        full_source = self._write_source(
+            'full.list.yaml', data_file, **options)
+
+        def ctl(*args):
+            subprocess.run(
+                [
+                    sys.executable,
+                    os.path.join(
+                        os.path.dirname(os.path.dirname(
+                            os.path.abspath(__file__))),
+                        'yamllistctl.py'),
+                    '-x', '-f', data_file,
+                ] + list(args),
+                stdout=subprocess.DEVNULL,
+                check=True)
+
+        plugin_class = type(inventory_loader.get('yaml_list'))
+        compute_entries = plugin_class._compute_entries
+        parse_records = plugin_class._parse_data_file_records
+        computed = []
+        parsed = []
+
+        def _compute_entries(plugin, data, record_ids=None):
+            computed.append(len(data))
+
+            return compute_entries(plugin, data, record_ids)
+
+        def _parse_data_file_records(plugin, path):
+            parsed.append(path)
+
+            return parse_records(plugin, path)
+
+        with mock.patch.object(
+                plugin_class, '_compute_entries', _compute_entries), \
+                mock.patch.object(
+                    plugin_class, '_parse_data_file_records',
+                    _parse_data_file_records):
+            ctl('-i', 'set', 'host1', 'state', 'poweredOn')
+            self._parse([source])
+            self.assertEqual(computed, [10])
+            self.assertEqual(parsed, [data_file])
+
+            # Only the changed records are parsed by the index
+            ctl('-i', 'set', 'host3', 'state', 'poweredOn')
+            ctl('-i', 'add', 'host10')
+
+            inventory = self._parse([source])
+            self.assertEqual(computed, [10, 2])
+            self.assertEqual(parsed, [data_file])
+
+            # Whole data file is parsed if the index is stale and the
+            # records are hashed differently
+            ctl('-i', 'remove', 'host4')
+
+            with open(data_file, 'a') as f:
+                f.write("# comment\n")
+
+            inventory = self._parse([source])
+            self.assertEqual(computed, [10, 2, 10])
+            self.assertEqual(parsed, [data_file, data_file])
+
+        full_inventory = self._parse([full_source])
+
+        self.assertEqual(self._groups(inventory), self._groups(full_inventory))
+        self.assertEqual(list(inventory.hosts), list(full_inventory.hosts))
+
+    def test_host_lookup(self):
+        data_file = self._write_yaml('data.yaml', [
+            {'name': 'host1', 'state': 'poweredOn'},
+            {'name': 'host2', 'state': 'poweredOff'},
+            {'name': 'host3', 'state': 'poweredOn'},
+            {'name': 'host2', 'state': 'poweredOn', 'ip': '2.2.2.2'},
+        ])
+        source = self._write_source(
+            'test.list.yaml', data_file,
+            host_lookup=True,
+            ignore=[{'state': 'poweredOff'}],
+            grouping={'on': [{'state': 'poweredOn'}]})
+
+        plugin_class = type(inventory_loader.get('yaml_list'))
+        iter_data_file = plugin_class._iter_data_file
+        scanned = []
+
+        def _iter_data_file(plugin, path):
+            scanned.append(path)
+
+            return iter_data_file(plugin, path)
+
+        with mock.patch.object(
+                plugin_class, '_iter_data_file', _iter_data_file):
+            # Whole data file is parsed without the index
+            with mock.patch.object(
+                    context, 'CLIARGS', CLIArgs({'subset': 'host2'})):
+                inventory = self._parse([source])
+
+            self.assertEqual(
+                sorted(inventory.hosts), ['host1', 'host2', 'host3'])
+
+            # Look up by the sidecar index
+            subprocess.run(
+                [
+                    sys.executable,
+                    os.path.join(
+                        os.path.dirname(os.path.dirname(
+                            os.path.abspath(__file__))),
+                        'yamllistctl.py'),
+                    '-x', '-f', data_file, 'search', 'host3',
+                ],
+                stdout=subprocess.DEVNULL)
+
+            for cliargs in ({'subset': 'host2'}, {'host': 'host2'}):
+                with mock.patch.object(
+                        context, 'CLIARGS', CLIArgs(cliargs)):
+                    inventory = self._parse([source])
+
+                # The first accepted record wins
+                self.assertEqual(list(inventory.hosts), ['host2'])
+                self.assertEqual(
+                    inventory.hosts['host2'].vars['ansible_host'], '2.2.2.2')
+                self.assertEqual(self._groups(inventory)['on'], ['host2'])
+
+            # Whole data file is parsed if the host is not found
+            for subset in ('on', 'host1,host3', 'host9'):
+                with mock.patch.object(
+                        context, 'CLIARGS', CLIArgs({'subset': subset})):
+                    inventory = self._parse([source])
+
+                self.assertEqual(
+                    sorted(inventory.hosts), ['host1', 'host2', 'host3'])
+
+        # The data file is never scanned
+        self.assertEqual(scanned, [])
+
+    def test_cache(self):
+        cache_dir = os.path.join(self.tmp_dir, 'cache')
+        data_file = self._write_yaml('data.yaml', [{'name': 'host1'}])
+        source = self._write_source(
+            'test.list.yaml', data_file,
+            cache=True,
+            cache_plugin='jsonfile',
+            cache_connection=cache_dir)
+
+        plugin_class = type(inventory_loader.get('yaml_list'))
+        parse_data_file = plugin_class._parse_data_file
+        parsed = []
+
+        def _parse_data_file(plugin, path):
+            parsed.append(path)
+
+            return parse_data_file(plugin, path)
+
+        with mock.patch.object(
+                plugin_class, '_parse_data_file', _parse_data_file):
+            self.assertEqual(list(self._parse([source]).hosts), ['host1'])
+            self.assertEqual(len(parsed), 1)
+
+            # Cached data must be used when the data file didn't change
+            self.assertEqual(list(self._parse([source]).hosts), ['host1'])
+            self.assertEqual(len(parsed), 1)
+
+            # Stale cache must be rebuilt
+            self._write_yaml(
+                'data.yaml', [{'name': 'host1'}, {'name': 'host2'}])
+
+            self.assertEqual(
+                list(self._parse([source]).hosts), ['host1', 'host2'])
+            self.assertEqual(len(parsed), 2)
+
+            # Corrupt cache must be rebuilt
+            for cache_file in os.listdir(cache_dir):
+                with open(os.path.join(cache_dir, cache_file), 'w') as f:
+                    f.write('{"data": ')
+
+            self.assertEqual(
+                list(self._parse([source]).hosts), ['host1', 'host2'])
+            self.assertEqual(len(parsed), 3)
+
+            # Cache must not be read when refreshing the inventory
+            self.assertEqual(
+                list(self._parse([source], cache=False).hosts),
+                ['host1', 'host2'])
+            self.assertEqual(len(parsed), 4)
+
+    def test_inventory_cache(self):
+        cache_dir = os.path.join(self.tmp_dir, 'cache')
+        data_file = self._write_yaml('data.yaml', [{'name': 'host1'}])
+        source = self._write_source(
+            'test.list.yaml', data_file,
+            cache=True,
+            cache_plugin='jsonfile',
+            cache_connection=cache_dir,
+            vars={'type': 'vm'})
+
+        plugin_class = type(inventory_loader.get('yaml_list'))
+        compute_entries = plugin_class._compute_entries
+        parse_data_file = plugin_class._parse_data_file
+        calls = []
+
+        def _compute_entries(plugin, data):
+            calls.append('compute')
+
+            return compute_entries(plugin, data)
+
+        def _parse_data_file(plugin, path):
+            calls.append('parse')
+
+            return parse_data_file(plugin, path)
+
+        with mock.patch.multiple(
+                plugin_class,
+                _compute_entries=_compute_entries,
+                _parse_data_file=_parse_data_file):
+            self._parse([source])
+            self.assertEqual(calls, ['parse', 'compute'])
+
+            # Computed inventory must be replayed from the cache
+            inventory = self._parse([source])
+            self.assertEqual(calls, ['parse', 'compute'])
+            self.assertEqual(self._groups(inventory), {
+                'ungrouped_hosts': ['host1'],
+            })
+            self.assertEqual(
+                inventory.hosts['host1'].vars['yaml_list'], {'type': 'vm'})
+
+            # Changed config must re-compute the inventory from cached data
+            self._write_source(
+                'test.list.yaml', data_file,
+                cache=True,
+                cache_plugin='jsonfile',
+                cache_connection=cache_dir,
+                vars={'type': 'container'})
+
+            inventory = self._parse([source])
+            self.assertEqual(calls, ['parse', 'compute', 'compute'])
+            self.assertEqual(
+                inventory.hosts['host1'].vars['yaml_list'],
+                {'type': 'container'})
+
+    def test_stats(self):
+        stats_file = os.path.join(self.tmp_dir, 'stats.json')
+        data_file = self._write_yaml('data.yaml', [
+            {'name': 'host1', 'state': 'poweredOn', 'guest': 'centos'},
+            {'name': 'host2', 'state': 'poweredOff'},
+            {'name': 'host3', 'state': 'suspended'},
+            {'name': 'host1', 'state': 'poweredOn'},
+        ])
+        source = self._write_source(
+            'test.list.yaml', data_file,
+            accept=[{'state': '~^powered'}],
+            ignore=[{'state': 'poweredOff'}],
+            grouping={'linux': [{'guest': 'centos'}]})
+
+        # Nothing is written unless enabled
+        self._parse([source])
+        self.assertFalse(os.path.exists(stats_file))
+
+        with mock.patch.dict(
+                os.environ, {'ANSIBLE_YAML_LIST_STATS_FILE': stats_file}):
+            self._parse([source])
+
+        with open(stats_file) as f:
+            stats = [json.loads(line) for line in f]
+
+        self.assertEqual(len(stats), 1)
+        self.assertEqual(stats[0]['source'], source)
+        self.assertEqual(stats[0]['counters'], {
+            'hosts': 4,
+            'rejected': 1,
+            'ignored': 1,
+            'accepted': 1,
+            'duplicates': 1,
+            # 4 accept, 3 ignore and 2 grouping
+            'evaluations': 9,
+            # host3 doesn't match
+            'regex_matches': 3,
+            'groups': 2,
+        })
+        self.assertEqual(
+            sorted(stats[0]['phases']),
+            [
+                'evaluate', 'filter', 'grouping', 'load', 'populate', 'read',
+                'total'
+            ])
+
+        # Hosts evaluated all at once and as they are parsed
+        for options, evaluations in (
+                ({'bulk_threshold': 0}, 10), ({'stream': True}, 9)):
+            with self.subTest(options=options):
+                source = self._write_source(
+                    'test.list.yaml', data_file,
+                    accept=[{'state': '~^powered'}],
+                    ignore=[{'state': 'poweredOff'}],
+                    grouping={'linux': [{'guest': 'centos'}]},
+                    stats_file=stats_file,
+                    **options)
+
+                self._parse([source])
+
+                with open(stats_file) as f:
+                    counters = json.loads(f.readlines()[-1])['counters']
+
+                self.assertEqual(
+                    [
+                        counters[name] for name in (
+                            'hosts', 'rejected', 'ignored', 'accepted',
+                            'duplicates', 'evaluations', 'regex_matches')
+                    ],
+                    [4, 1, 1, 1, 1, evaluations, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
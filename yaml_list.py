@@ -94,6 +94,127 @@ DOCUMENTATION = '''
           - Prefix which can be used for keys of inside the C(ansible) key to
             set top-level facts.
         default: ^
+      cache_hash:
+        description:
+          - Whether to validate the cached data of the C(data_file) and the
+            cached computed inventory also by the hash of the C(data_file)
+            content. The path, modification time and size of the file are
+            always validated.
+          - The cache is used only if enabled by the C(cache) option. Use a
+            cache plugin with binary serialization (e.g.
+            C(community.general.pickle)) for the fastest loading.
+        type: bool
+        default: no
+      incremental:
+        description:
+          - Whether to cache the hash of the text of each record of the
+            C(data_file) together with the computed inventory and re-evaluate
+            only the new and changed records when the C(data_file) changes.
+            The parsed C(data_file) is not cached in this mode.
+          - Without the sidecar index of the C(data_file) maintained by
+            C(yamllistctl.py --index) the whole C(data_file) is still parsed
+            so only the evaluation of the unchanged records is saved. With
+            the index only the changed records are parsed unless they are
+            more than half of all records. The cached inventory is loaded in
+            both cases.
+          - The records are hashed differently with and without the index so
+            all of them are evaluated once when the index becomes stale or
+            valid again.
+          - All records are evaluated if they share anchored values. The
+            index is not used if the C(data_file) contains anchors or aliases.
+          - The cache is used only if enabled by the C(cache) option. Not used
+            with the C(stream) option.
+        type: bool
+        default: no
+      stream:
+        description:
+          - Whether to parse the C(data_file) record by record and evaluate
+            each record as soon as it's parsed. Only the accepted records are
+            kept in memory but the parsed C(data_file) is not cached (the
+            computed inventory still is).
+        type: bool
+        default: no
+      bulk_threshold:
+        description:
+          - Minimal number of hosts for which the conditions are evaluated
+            key by key for all hosts at once instead of host by host.
+          - Set to C(0) to always use the bulk evaluation.
+        type: int
+        default: 1000
+      host_lookup:
+        description:
+          - Whether to look up only the host given by the C(--host) option of
+            C(ansible-inventory) or by the C(--limit) option if it's a single
+            host name. The host is found by the sidecar index of the
+            C(data_file) maintained by C(yamllistctl.py --index) and only its
+            record is evaluated.
+          - The inventory then contains only that host so the other hosts and
+            their groups are not available to the play. The whole
+            C(data_file) is parsed as usual (possibly from the cache) if the
+            index is missing or stale or if the host is not found in it.
+        type: bool
+        default: no
+      preload:
+        description:
+          - Whether to load and evaluate the C(data_file) of all inventory
+            sources (C(*.list.yaml) and C(*.list.yml) files) in the same
+            directory in parallel when the first of them is parsed. Each
+            source then only adds the already computed hosts into the
+            inventory.
+          - All sibling sources with this option enabled are evaluated even
+            if Ansible was asked to parse only one of them (e.g. by
+            C(-i dir/source.list.yaml)). Their results are dropped when the
+            next directory is preloaded.
+          - The parsed C(data_file) is not cached in this mode (the computed
+            inventory still is).
+        type: bool
+        default: no
+      parallel:
+        description:
+          - Whether to evaluate the C(accept), C(ignore) and C(grouping)
+            conditions of big C(data_file) in chunks in parallel.
+          - Not used with the C(stream) option.
+        type: bool
+        default: no
+      parallel_threshold:
+        description:
+          - Minimal number of hosts for which the conditions are evaluated in
+            parallel if enabled by the C(parallel) option.
+        type: int
+        default: 50000
+      workers:
+        description:
+          - Number of worker processes used by the C(preload) and C(parallel)
+            options.
+          - Set to C(0) to use the number of CPUs.
+        type: int
+        default: 0
+      stats:
+        description:
+          - Whether to measure the wall time of the individual phases of the
+            parsing (C(lookup), C(read), C(load), C(evaluate) including
+            C(filter) and C(grouping), C(populate) and C(total)) and to count
+            the hosts seen, rejected by the C(accept) conditions, matched by
+            the C(ignore) conditions, added into the inventory and defined
+            twice, the evaluations of the conditions for a single host, the
+            successful regular expression matches and the groups created.
+          - The statistics are shown with the C(-vvv) verbosity. The counters
+            cover only the records evaluated by the main process (not those
+            taken from the cache or evaluated by the C(preload) and
+            C(parallel) workers).
+        type: bool
+        default: no
+        env:
+          - name: ANSIBLE_YAML_LIST_STATS
+      stats_file:
+        description:
+          - Path to the file to which the statistics of each parsed inventory
+            source are appended as a JSON line. Enables the C(stats) option.
+        type: path
+        env:
+          - name: ANSIBLE_YAML_LIST_STATS_FILE
+    extends_documentation_fragment:
+      - inventory_cache
 '''
 
 EXAMPLES = '''
@@ -161,20 +282,139 @@ data_file: /path/to/the/data_file.yaml
 '''
 
 
+from ansible import constants as C
+from ansible import context
 from ansible.errors import AnsibleError, AnsibleParserError
-from ansible.plugins.inventory import BaseFileInventoryPlugin
-
+from ansible.plugins.inventory import BaseFileInventoryPlugin, Cacheable
+from ansible.utils.multiprocessing import context as multiprocessing_context
+
+import contextlib
+import copy
+import functools
+import glob
+import hashlib
+import json
+import os
 import yaml
 import re
+import struct
+import time
+
+from yaml.composer import Composer
+from yaml.constructor import SafeConstructor
+from yaml.resolver import Resolver
+
+# Use the libyaml-based loader if PyYAML was built with it
+try:
+    from yaml import CSafeLoader as SafeLoader
+    from yaml.cyaml import CParser
+except ImportError:
+    from yaml import SafeLoader
+    CParser = None
+
+
+if CParser is not None:
+    # libyaml parser with the Python composer which allows to compose the
+    # nodes one by one
+    class StreamLoader(CParser, Composer, SafeConstructor, Resolver):
+        def __init__(self, stream):
+            CParser.__init__(self, stream)
+            Composer.__init__(self)
+            SafeConstructor.__init__(self)
+            Resolver.__init__(self)
+else:
+    StreamLoader = SafeLoader
+
+
+class _CountedPattern(object):
+    # Compiled regular expression counting its matches into the stats
+    def __init__(self, regexp, counters):
+        self.regexp = regexp
+        self.counters = counters
+
+    def match(self, string):
+        match = self.regexp.match(string)
+
+        if match is not None:
+            self.counters['regex_matches'] += 1
+
+        return match
+
+
+def _preload_worker(i):
+    # Runs in a forked worker process which inherited the jobs
+    plugin, source, data_file = InventoryModule._preload_jobs[i]
+
+    try:
+        return plugin._compute_entries(
+            plugin._get_data(source, data_file, True))
+    except Exception:
+        # The source will be parsed again by the main process which reports
+        # the error
+        return None
+
+
+def _match_worker(i):
+    # Runs in a forked worker process which inherited the chunks
+    plugin, data, accept, ignore, grouping, chunks = (
+        InventoryModule._match_jobs)
+    start, end = chunks[i]
+    ids, memos, hosts_groups = plugin._match_hosts(
+        data[start:end], accept, ignore, grouping)
+
+    # Return only the bitsets of the accepted hosts and of the members of
+    # each group
+    groups_ids = dict((group, []) for group, program in grouping)
+
+    for n, host_groups in enumerate(hosts_groups):
+        for group in host_groups:
+            groups_ids[group].append(n)
+
+    return (
+        plugin._encode_ids(ids, end - start),
+        [
+            plugin._encode_ids(groups_ids[group], len(ids))
+            for group, program in grouping])
+
+
+class InventoryModule(BaseFileInventoryPlugin, Cacheable):
+    NAME = 'yaml_list'
 
+    # Kinds of the compiled condition values
+    COND_VALUE = 0
+    COND_NEG_VALUE = 1
+    COND_REGEXP = 2
+    COND_NEG_REGEXP = 3
+    COND_NONE = 4
 
-class InventoryModule(BaseFileInventoryPlugin):
-    NAME = 'yaml_list'
-    created_groups = []
+    # Matches reference to a list's item in the key path
+    KEY_INDEX_RE = re.compile(r'(.*)\[(\d+)\]$')
+
+    # Sidecar index of the data file maintained by yamllistctl.py
+    INDEX_MAGIC = b'YLIDX\x00\x00\x01'
+    INDEX_HEADER = struct.Struct('<8sQqI')
+    INDEX_NAME = struct.Struct('<H')
+    INDEX_RECORD = struct.Struct('<QI16s')
+
+    # Possible anchor or alias in the YAML content
+    ANCHOR_RE = re.compile(r'(?:^|[\s\[{,:])[&*]', re.M)
+
+    # Host name which can be looked up alone
+    LOOKUP_HOST_RE = re.compile(r'^[\w.-]+$')
+
+    # Entries computed by the preload shared by all instances
+    _preloaded = {}
+    _preload_jobs = []
+    _match_jobs = None
 
     def __init__(self):
         super(InventoryModule, self).__init__()
 
+        self._reset_patterns()
+        self._reset_path_stats()
+        self._reset_stats()
+        self._created_groups = set()
+
     def verify_file(self, path):
         valid = False
 
@@ -195,46 +435,670 @@ class InventoryModule(BaseFileInventoryPlugin):
 
         data_file = self.get_option('data_file')
 
-        # Parse the YAML file
+        # Patterns are compiled once per inventory source
+        self._reset_patterns()
+
+        # Groups and statistics are tracked per inventory source
+        self._created_groups = set()
+        self._reset_stats(
+            self.get_option('stats') or bool(self.get_option('stats_file')))
+
+        # Invalid conditions fail before the data file is read
+        self._get_programs()
+
+        with self._phase('total'):
+            entries = None
+
+            if self.get_option('host_lookup'):
+                with self._phase('lookup'):
+                    entries = self._lookup_host(data_file)
+
+            if entries is None:
+                # Get the computed inventory (possibly from cache)
+                entries = self._get_entries(path, data_file, cache)
+
+            # Add individual hosts
+            with self._phase('populate'):
+                self._populate(entries)
+
+        self._report_stats(path)
+
+    def _reset_stats(self, enabled=False):
+        # Nothing is measured or counted unless enabled
+        if enabled:
+            self._stats = {
+                'phases': {},
+                'counters': dict.fromkeys([
+                    'hosts',
+                    'rejected',
+                    'ignored',
+                    'accepted',
+                    'duplicates',
+                    'evaluations',
+                    'regex_matches',
+                ], 0),
+            }
+        else:
+            self._stats = None
+
+    @contextlib.contextmanager
+    def _phase(self, name):
+        # Adds the wall time of the block to the phase
+        if self._stats is None:
+            yield
+
+            return
+
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            phases = self._stats['phases']
+            phases[name] = (
+                phases.get(name, 0.0) + time.perf_counter() - start)
+
+    def _report_stats(self, path):
+        if self._stats is None:
+            return
+
+        phases = self._stats['phases']
+        counters = self._stats['counters']
+        counters['groups'] = len(self._created_groups)
+
+        self.display.vvv(
+            "Phases of '%s': %s" % (path, ', '.join(
+                '%s %.3fs' % (name, phases[name]) for name in sorted(phases))))
+        self.display.vvv(
+            "Counters of '%s': %s" % (path, ', '.join(
+                '%s %d' % (name, counters[name])
+                for name in sorted(counters))))
+
+        stats_file = self.get_option('stats_file')
+
+        if not stats_file:
+            return
+
         try:
-            data = yaml.safe_load(self._read_yaml_file(data_file))
+            with open(stats_file, 'a') as f:
+                f.write("%s\n" % json.dumps({
+                    'source': path,
+                    'data_file': self.get_option('data_file'),
+                    'time': time.time(),
+                    'phases': phases,
+                    'counters': counters,
+                }, sort_keys=True))
+        except IOError as e:
+            self.display.warning(
+                "Cannot write stats file '%s': %s" % (stats_file, e))
+
+    def _lookup_host(self, data_file):
+        # Returns entry of the single host requested on the command line or
+        # None if the whole data file must be parsed
+        host = context.CLIARGS.get('host')
+
+        if not host:
+            host = context.CLIARGS.get('subset')
+
+        if not isinstance(host, str) or not self.LOOKUP_HOST_RE.match(host):
+            return None
+
+        # Scanning the data file would cost more than parsing it as usual
+        records = self._read_index_records(data_file, host)
+
+        if records is None:
+            return None
+
+        self.display.vvv(
+            "Found %d records of host '%s' in the index of '%s'" % (
+                len(records), host, data_file))
+
+        # The first accepted record wins
+        for record in records:
+            entries = self._compute_entries([record])
+
+            if entries:
+                return entries
+
+        self.display.vvv("Host '%s' not found in '%s'" % (host, data_file))
+
+        return None
+
+    def _read_index_records(self, data_file, host):
+        # Returns records of the host found by the sidecar index or None if
+        # the index is missing or doesn't match the data file
+        index = self._read_index(data_file)
+
+        if index is None:
+            return None
+
+        name = host.encode('utf-8')
+        spans = [
+            (offset, length, h)
+            for record_name, offset, length, h in index
+            if record_name == name]
+        records = []
+
+        try:
+            with open(data_file, 'rb') as f:
+                for offset, length, h in spans:
+                    f.seek(offset)
+                    text = f.read(length)
+
+                    if hashlib.blake2b(text, digest_size=16).digest() != h:
+                        self.display.vvv(
+                            "Index of '%s' doesn't match the data file" %
+                            data_file)
+
+                        return None
+
+                    records += yaml.load(text, Loader=SafeLoader)
+        except IOError as e:
+            raise AnsibleError(
+                "E: Cannot read file '%s'.\n%s" % (data_file, e))
         except yaml.YAMLError as e:
             raise AnsibleParserError(
                 "Unable parse inventory '%s': %s" % (data_file, e))
 
-        group_key = self.get_option('group_key')
-        ip_key = self.get_option('ip_key')
-        top_fact = self.get_option('top_fact_key_prefix')
+        return records
+
+    def _read_index(self, data_file):
+        # Returns list of (name, offset, length, hash) of all records in the
+        # sidecar index or None if the index is missing or stale
+        path = '%s.idx' % os.path.realpath(data_file)
+
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+
+            st = os.stat(data_file)
+        except (IOError, OSError) as e:
+            self.display.vvv("Unable to read index '%s': %s" % (path, e))
+
+            return None
+
+        try:
+            magic, size, mtime, count = self.INDEX_HEADER.unpack_from(content)
+        except struct.error:
+            magic = None
+
+        if (
+                magic != self.INDEX_MAGIC or
+                (size, mtime) != (st.st_size, st.st_mtime_ns)):
+            self.display.vvv("Index '%s' is stale" % path)
+
+            return None
+
+        index = []
+        pos = self.INDEX_HEADER.size
+
+        try:
+            for _ in range(count):
+                name_len, = self.INDEX_NAME.unpack_from(content, pos)
+                pos += self.INDEX_NAME.size
+                record_name = content[pos:pos + name_len]
+                pos += name_len
+
+                index.append(
+                    (record_name,) +
+                    self.INDEX_RECORD.unpack_from(content, pos))
+
+                pos += self.INDEX_RECORD.size
+        except struct.error:
+            self.display.vvv("Index '%s' is corrupt" % path)
+
+            return None
+
+        return index
+
+    def _get_entries(self, path, data_file, cache):
+        user_cache_setting = self.get_option('cache')
+        attempt_to_read_cache = user_cache_setting and cache
+        cache_needs_update = user_cache_setting and not cache
+        stamp = None
+
+        if user_cache_setting:
+            cache_key = '%s_inventory' % self.get_cache_key(path)
+            stamp = self._get_file_stamp(data_file)
+            inventory_stamp = [self._get_config_digest(), stamp]
+
+        if attempt_to_read_cache:
+            entries = self._read_cache(cache_key, inventory_stamp, 'hosts')
+
+            if entries is not None:
+                self.display.debug(
+                    "Using cached inventory of '%s'" % data_file)
+
+                return entries
+
+            cache_needs_update = True
+
+        entries = None
+        records = None
+
+        if self.get_option('preload'):
+            entries = self._get_preloaded(path)
+
+        if entries is None:
+            if (
+                    user_cache_setting and
+                    self.get_option('incremental') and
+                    not self.get_option('stream')):
+                entries, records = self._compute_entries_incremental(
+                    data_file, cache_key, cache)
+            else:
+                data = self._get_data(path, data_file, cache, stamp)
+
+                # Includes the parsing of the data file in the stream mode
+                with self._phase('evaluate'):
+                    entries = self._compute_entries(data)
+
+        if cache_needs_update:
+            self._cache[cache_key] = {
+                'stamp': inventory_stamp,
+                'hosts': entries,
+            }
+
+            if records is not None:
+                self._cache[cache_key]['records'] = records
+
+        return entries
+
+    def _get_data(self, path, data_file, cache, stamp=None):
+        if self.get_option('stream'):
+            # Hosts are evaluated as they are parsed
+            data = self._iter_data_file(data_file)
+        else:
+            # Get the parsed data file (possibly from cache)
+            data = self._load_data_file(path, data_file, cache, stamp)
+
+        return data
+
+    def _compute_entries_incremental(self, data_file, cache_key, cache):
+        # Evaluates only the records whose text is not in the cached
+        # inventory. Returns the entries and list of [hash, entry index]
+        # pairs of all records to be cached with the entries.
+        previous = {}
+        previous_entries = []
+
+        if cache:
+            try:
+                cached = self._cache[cache_key]
+            except (KeyError, AnsibleError):
+                cached = None
+
+            # The cached inventory is stale but the outcome of each record
+            # is still valid for the same configuration
+            try:
+                if cached['stamp'][0] == self._get_config_digest():
+                    previous_entries = cached['hosts']
+                    previous = dict(cached['records'])
+            except (IndexError, KeyError, TypeError, ValueError):
+                self.display.vvv("No records in the cache '%s'" % cache_key)
+
+        indexed = self._read_indexed_records(data_file)
+        data = None
+
+        if indexed is not None:
+            content, spans, hashes = indexed
+            changed = [n for n, h in enumerate(hashes) if h not in previous]
+
+            # Parsing the records one by one pays off only for few of them
+            if len(changed) * 2 <= len(hashes):
+                data = self._load_records(
+                    data_file, content, [spans[n] for n in changed])
+
+        if data is None:
+            data, text_hashes = self._parse_data_file_records(data_file)
+
+            # Hashes of the index are kept even if all records are parsed
+            if (
+                    indexed is None or
+                    not isinstance(data, list) or
+                    len(data) != len(hashes)):
+                hashes = text_hashes
+
+            if hashes is None:
+                with self._phase('evaluate'):
+                    return self._compute_entries(data), None
+
+            changed = [n for n, h in enumerate(hashes) if h not in previous]
+            data = [data[n] for n in changed]
+
+        with self._phase('evaluate'):
+            record_ids = []
+            computed = self._compute_entries(data, record_ids)
+
+            # Records which were not accepted have no entry
+            outcomes = dict((hashes[n], None) for n in changed)
+
+            for n, entry in zip(record_ids, computed):
+                outcomes[hashes[changed[n]]] = entry
+
+            entries = []
+            records = []
+
+            for h in hashes:
+                if h in outcomes:
+                    entry = outcomes[h]
+                elif previous[h] is None:
+                    entry = None
+                else:
+                    entry = previous_entries[previous[h]]
+
+                if entry is None:
+                    records.append([h, None])
+                else:
+                    records.append([h, len(entries)])
+                    entries.append(entry)
+
+        self.display.vvv(
+            "Evaluated %d of %d records of '%s'" % (
+                len(changed), len(hashes), data_file))
+
+        return entries, records
+
+    def _read_indexed_records(self, data_file):
+        # Returns the content of the data file, the (offset, length) spans
+        # and the hashes of all records taken from the sidecar index or None
+        # if the index doesn't cover the whole data file
+        with self._phase('read'):
+            index = self._read_index(data_file)
+
+            if index is None:
+                return None
+
+            try:
+                with open(data_file, 'rb') as f:
+                    content = f.read()
+            except IOError as e:
+                raise AnsibleError(
+                    "E: Cannot read file '%s'.\n%s" % (data_file, e))
+
+        spans = []
+        hashes = []
+        pos = 0
+
+        # Only comments can be left out of the index
+        for _, offset, length, h in index:
+            if (
+                    offset < pos or
+                    not self._is_gap(content[pos:offset]) or
+                    hashlib.blake2b(
+                        content[offset:offset + length],
+                        digest_size=16).digest() != h):
+                self.display.vvv(
+                    "Index of '%s' doesn't match the data file" % data_file)
+
+                return None
+
+            pos = offset + length
+            spans.append((offset, length))
+            hashes.append(h.hex())
+
+        if not self._is_gap(content[pos:]):
+            self.display.vvv(
+                "Index of '%s' doesn't match the data file" % data_file)
+
+            return None
+
+        # The records can't be parsed alone
+        try:
+            if self.ANCHOR_RE.search(content.decode('utf-8')):
+                self.display.vvv(
+                    "Data file '%s' can contain anchors, not using the "
+                    "index" % data_file)
+
+                return None
+        except UnicodeDecodeError:
+            return None
+
+        return content, spans, hashes
+
+    def _load_records(self, data_file, content, spans):
+        # Parses the records of the spans one by one. Returns None if any of
+        # them isn't a single record.
+        data = []
+
+        try:
+            with self._phase('load'):
+                for offset, length in spans:
+                    records = yaml.load(
+                        content[offset:offset + length], Loader=SafeLoader)
+
+                    if not isinstance(records, list) or len(records) != 1:
+                        self.display.vvv(
+                            "Index of '%s' doesn't match the data file" %
+                            data_file)
+
+                        return None
+
+                    data += records
+        except yaml.YAMLError as e:
+            raise AnsibleParserError(
+                "Unable parse inventory '%s': %s" % (data_file, e))
+
+        return data
+
+    @staticmethod
+    def _is_gap(text):
+        # Whether the text contains only blank lines, comments, directives
+        # and document markers
+        for line in text.splitlines():
+            line = line.strip()
 
-        # Add individual hosts
-        for host in data:
-            # Check if we want to accept this host
             if (
-                    not self._eval_conditions(
-                        host, self.get_option('accept')) or
-                    self._eval_conditions(
-                        host, self.get_option('ignore'), False)):
+                    line not in (b'', b'---', b'...') and
+                    not line.startswith((b'#', b'%', b'--- #'))):
+                return False
+
+        return True
+
+    def _parse_data_file_records(self, data_file):
+        # Parse the YAML file and hash the text of each record. The hashes
+        # are None if the records can't be told apart by their text.
+        with self._phase('read'):
+            content = self._read_yaml_file(data_file)
+
+        try:
+            with self._phase('load'):
+                loader = SafeLoader(content)
+
+                try:
+                    node = loader.get_single_node()
+                    data = None
+
+                    if node is not None:
+                        data = loader.construct_document(node)
+                finally:
+                    loader.dispose()
+        except yaml.YAMLError as e:
+            raise AnsibleParserError(
+                "Unable parse inventory '%s': %s" % (data_file, e))
+
+        if not isinstance(data, list):
+            return data, None
+
+        # The text of the record doesn't contain the aliased values
+        if self.ANCHOR_RE.search(content) and self._has_shared_nodes(node):
+            self.display.vvv(
+                "Records of '%s' share anchored values, evaluating all of "
+                "them" % data_file)
+
+            return data, None
+
+        return data, [
+            hashlib.blake2b(
+                content[
+                    item.start_mark.index:item.end_mark.index
+                ].encode('utf-8'),
+                digest_size=16
+            ).hexdigest()
+            for item in node.value]
+
+    @staticmethod
+    def _has_shared_nodes(node):
+        # Whether any node of the sequence items is aliased by another item
+        owners = {}
+
+        for n, item in enumerate(node.value):
+            nodes = [item]
+
+            while nodes:
+                child = nodes.pop()
+
+                if id(child) in owners:
+                    if owners[id(child)] != n:
+                        return True
+
+                    continue
+
+                owners[id(child)] = n
+
+                if isinstance(child, yaml.MappingNode):
+                    for key, value in child.value:
+                        nodes += (key, value)
+                elif isinstance(child, yaml.SequenceNode):
+                    nodes += child.value
+
+        return False
+
+    def _get_preloaded(self, path):
+        path = os.path.abspath(path)
+
+        if path not in self._preloaded:
+            self._preload(path)
+
+        digest, entries = self._preloaded.pop(path, (None, None))
+
+        # The source could have changed since it was preloaded
+        if entries is None or digest != self._get_config_digest():
+            return None
+
+        self.display.debug("Using preloaded inventory of '%s'" % path)
+
+        return entries
+
+    def _preload(self, path):
+        # Computes the entries of all sources in the directory of the path in
+        # parallel
+        if self._preloaded:
+            # Sources of the previous directory which were never parsed
+            self.display.vvv(
+                "Dropping preloaded inventory of %d sources" % len(
+                    self._preloaded))
+
+            self._preloaded.clear()
+
+        directory = os.path.dirname(path)
+        sources = sorted(
+            glob.glob(os.path.join(glob.escape(directory), '*.list.yaml')) +
+            glob.glob(os.path.join(glob.escape(directory), '*.list.yml')))
+        jobs = []
+
+        for source in sources:
+            if source in self._preloaded or not self.verify_file(source):
                 continue
 
-            # Don't add the same host twice
-            if host['name'] in self.inventory.hosts:
-                self.display.warning(
-                    "Host '%s' is defined twice." % host['name'])
+            plugin = copy.copy(self)
+            plugin._reset_patterns()
+            plugin._reset_path_stats()
+            plugin._reset_stats()
+            plugin._created_groups = set()
+
+            try:
+                plugin._consume_options(plugin._read_config_data(source))
+                plugin._get_programs()
+            except AnsibleError as e:
+                self.display.vvv("Not preloading '%s': %s" % (source, e))
 
                 continue
 
+            if not plugin.get_option('preload'):
+                continue
+
+            jobs.append((plugin, source, plugin.get_option('data_file')))
+
+        workers = self._get_workers(len(jobs))
+
+        self.display.vvv(
+            "Preloading %d inventory sources with %d workers" % (
+                len(jobs), workers))
+
+        # The jobs are inherited by the forked workers
+        InventoryModule._preload_jobs = jobs
+
+        try:
+            if workers > 1:
+                with multiprocessing_context.Pool(workers) as pool:
+                    results = pool.map(_preload_worker, range(len(jobs)), 1)
+            else:
+                results = [_preload_worker(i) for i in range(len(jobs))]
+        finally:
+            InventoryModule._preload_jobs = []
+
+        for (plugin, source, data_file), entries in zip(jobs, results):
+            # Failed sources are not preloaded again
+            self._preloaded[source] = (plugin._get_config_digest(), entries)
+
+    def _get_workers(self, jobs):
+        return min(self.get_option('workers') or os.cpu_count() or 1, jobs)
+
+    def _compute_entries(self, data, record_ids=None):
+        # Evaluates all records and returns list of [name, groups, vars]
+        # entries of the accepted hosts. The ids of the records of the entries
+        # are added into the record_ids list if given.
+        entries = []
+
+        group_key = self._split_key_path(self.get_option('group_key'))
+        ip_key = self.get_option('ip_key')
+        top_fact = self.get_option('top_fact_key_prefix')
+        # Group names are kept without the tags of the config values which
+        # are expensive to serialize into the cache for every host
+        ungrouped_name = str(self.get_option('ungrouped_name'))
+        add_inv_var = self.get_option('add_inv_var')
+        inv_var_key = self.get_option('inv_var_key')
+        inventory_wide_vars = self.get_option('vars')
+        accept, ignore, grouping = self._get_programs()
+
+        self._reset_path_stats()
+
+        # Check which hosts we want to accept
+        if not isinstance(data, list):
+            hosts = self._filter_stream(data, accept, ignore)
+            hosts_groups = None
+            ids = None
+        elif (
+                self.get_option('parallel') and
+                len(data) >= self.get_option('parallel_threshold') and
+                self._get_workers(len(data)) > 1):
+            if self._stats is not None:
+                self._stats['counters']['hosts'] += len(data)
+
+            ids, hosts_groups = self._match_hosts_parallel(
+                data, accept, ignore, grouping)
+            hosts = [(data[n], None) for n in ids]
+        else:
+            if self._stats is not None:
+                self._stats['counters']['hosts'] += len(data)
+
+            ids, memos, hosts_groups = self._match_hosts(
+                data, accept, ignore, grouping)
+            hosts = [(data[n], memo) for n, memo in zip(ids, memos)]
+
+        for i, (host, memo) in enumerate(hosts):
             # Override the default group if requested
             if (
-                    'ansible' not in host or 
+                    'ansible' not in host or
                     'group' not in host['ansible'] or (
                         'override_ungrouped' in host['ansible'] and
                         host['ansible']['override_ungrouped'] is False)):
-                groups = [self.get_option('ungrouped_name')]
+                groups = [ungrouped_name]
             else:
                 groups = []
 
             # Check if the group_key exists in the host
-            gk_exists, gk_v = self._get_host_key_value(host, group_key)
+            gk_exists, gk_v = self._get_key_value(host, group_key, memo)
 
             # Check if host has associated group(s)
             if gk_exists:
@@ -247,70 +1111,572 @@ class InventoryModule(BaseFileInventoryPlugin):
                         groups += [gk_v]
 
             # Add the host into each of the groups
-            for group in groups:
-                if group != '':
-                    self._create_group(group)
-                    self.inventory.add_host(host['name'], group)
-
-                    inventory_vars = {}
-
-                    # Add ansible_host variable
-                    if 'ip' in host and host['ip'] is not None:
-                        self.inventory.set_variable(
-                            host['name'], ip_key, host['ip'])
-
-                    # Add inventory-wide variables
-                    for k, v in self.get_option('vars').items():
-                        inventory_vars[k] = v
-
-                    # Add all host data as inventory vars
-                    if self.get_option('add_inv_var'):
-                        for k, v in host.items():
-                            # Ignore 'ip' and 'name' keys
-                            if k not in ['ip', 'name']:
-                                # Make top-level facts for specific keys inside
-                                # the ansible.* key
-                                if k == 'ansible':
-                                    for ak, av in v.items():
-                                        if (
-                                                ak.startswith('ansible_') or
-                                                ak.startswith(top_fact)):
-                                            if ak.startswith(top_fact):
-                                                ak = ak[1:]
-
-                                            inventory.set_variable(
-                                                host['name'], ak, av)
-
-                                inventory_vars[k] = v
-
-                    # Set the inventory variable
-                    self.inventory.set_variable(
-                        host['name'],
-                        self.get_option('inv_var_key'),
-                        inventory_vars)
+            host_groups = [group for group in groups if group != '']
+            host_vars = None
+
+            # Build the host variables only once
+            if host_groups:
+                host_vars = {}
+
+                # Add ansible_host variable
+                if 'ip' in host and host['ip'] is not None:
+                    host_vars[ip_key] = host['ip']
+
+                # Add inventory-wide variables
+                inventory_vars = dict(inventory_wide_vars)
+
+                # Add all host data as inventory vars
+                if add_inv_var:
+                    for k, v in host.items():
+                        # Ignore 'ip' and 'name' keys
+                        if k not in ['ip', 'name']:
+                            # Make top-level facts for specific keys inside
+                            # the ansible.* key
+                            if k == 'ansible':
+                                for ak, av in v.items():
+                                    if (
+                                            ak.startswith('ansible_') or
+                                            ak.startswith(top_fact)):
+                                        if ak.startswith(top_fact):
+                                            ak = ak[1:]
+
+                                        host_vars[ak] = av
+
+                            inventory_vars[k] = v
+
+                # Set the inventory variable
+                host_vars[inv_var_key] = inventory_vars
 
             # Apply grouping
-            for group, conditions in self.get_option('grouping').items():
-                if self._eval_conditions(host, conditions):
-                    self._create_group(group)
-                    self.inventory.add_host(host['name'], group)
+            if hosts_groups is None:
+                for group, program in grouping:
+                    if self._match_conditions(host, program, memo=memo):
+                        host_groups.append(group)
+            else:
+                host_groups += hosts_groups[i]
+
+            entries.append([host['name'], host_groups, host_vars])
+
+        self.display.debug(
+            "Key paths parsed: %s; values walked: %d, reused: %d" % (
+                self._split_key_path.cache_info(),
+                self._path_stats['walks'],
+                self._path_stats['hits']))
+
+        if record_ids is not None:
+            record_ids += ids
+
+        return entries
+
+    def _match_hosts(self, data, accept, ignore, grouping):
+        # Returns ids of the accepted hosts, their memos and the groups
+        # matching each of them
+        with self._phase('filter'):
+            ids, memos, columns = self._filter_hosts(data, accept, ignore)
+
+        with self._phase('grouping'):
+            hosts_groups = self._match_grouping(
+                [data[n] for n in ids],
+                grouping,
+                len(ids) >= self.get_option('bulk_threshold'),
+                columns,
+                memos)
+
+        return ids, memos, hosts_groups
+
+    def _filter_hosts(self, data, accept, ignore):
+        # Returns ids of the accepted hosts, their memos and the columns of
+        # the extracted values of the accepted hosts
+        columns = {}
+
+        if len(data) >= self.get_option('bulk_threshold'):
+            accepted = self._match_conditions_bulk(data, accept, columns)
+            ignored = self._match_conditions_bulk(
+                data, ignore, columns, False)
+            ids = [
+                n for n, (a, i) in enumerate(zip(accepted, ignored))
+                if a and not i]
+            memos = [None] * len(ids)
+            n_ignored = 0
+
+            if self._stats is not None:
+                n_ignored = sum(
+                    1 for a, i in zip(accepted, ignored) if a and i)
+
+            # Reuse the extracted values for the grouping
+            columns = dict(
+                (path, [column[n] for n in ids])
+                for path, column in columns.items())
+        else:
+            ids = []
+            memos = []
+            n_ignored = 0
+
+            for n, host in enumerate(data):
+                # Each key path is walked at most once per host
+                memo = {}
+
+                if not self._match_conditions(host, accept, memo=memo):
+                    continue
+
+                if self._match_conditions(host, ignore, False, memo=memo):
+                    n_ignored += 1
+                else:
+                    ids.append(n)
+                    memos.append(memo)
+
+        if self._stats is not None:
+            counters = self._stats['counters']
+            counters['rejected'] += len(data) - len(ids) - n_ignored
+            counters['ignored'] += n_ignored
+
+        return ids, memos, columns
+
+    def _filter_stream(self, data, accept, ignore):
+        # Yields the accepted hosts and their memos as they are parsed
+        counters = None
+
+        if self._stats is not None:
+            counters = self._stats['counters']
+
+        for host in data:
+            # Each key path is walked at most once per host
+            memo = {}
+
+            if counters is not None:
+                counters['hosts'] += 1
+
+            if not self._match_conditions(host, accept, memo=memo):
+                if counters is not None:
+                    counters['rejected'] += 1
+            elif self._match_conditions(host, ignore, False, memo=memo):
+                if counters is not None:
+                    counters['ignored'] += 1
+            else:
+                yield host, memo
+
+    def _match_hosts_parallel(self, data, accept, ignore, grouping):
+        # Evaluates chunks of the data in parallel and merges the results in
+        # the original order
+        workers = self._get_workers(len(data))
+        size = -(-len(data) // (workers * 4))
+        chunks = [
+            (start, min(start + size, len(data)))
+            for start in range(0, len(data), size)]
+
+        self.display.vvv(
+            "Evaluating %d hosts in %d chunks with %d workers" % (
+                len(data), len(chunks), workers))
+
+        # The data and the compiled conditions are inherited by the forked
+        # workers
+        InventoryModule._match_jobs = (
+            self, data, accept, ignore, grouping, chunks)
+
+        try:
+            with multiprocessing_context.Pool(workers) as pool:
+                results = pool.map(_match_worker, range(len(chunks)), 1)
+        finally:
+            InventoryModule._match_jobs = None
+
+        ids = []
+        hosts_groups = []
+
+        for (start, end), (accepted, groups_bits) in zip(chunks, results):
+            chunk_ids = self._decode_ids(accepted)
+            chunk_groups = [[] for _ in chunk_ids]
+
+            for (group, program), bits in zip(grouping, groups_bits):
+                for i in self._decode_ids(bits):
+                    chunk_groups[i].append(group)
+
+            ids += [start + n for n in chunk_ids]
+            hosts_groups += chunk_groups
+
+        return ids, hosts_groups
+
+    def _encode_ids(self, ids, size):
+        # Turns the list of ids into a bitset
+        bits = bytearray(b'0' * size)
+
+        for i in ids:
+            bits[size - 1 - i] = ord('1')
+
+        return int(bits, 2) if size else 0
+
+    def _decode_ids(self, bits):
+        # Turns the bitset into a sorted list of ids
+        ids = []
+        s = format(bits, 'b')[::-1]
+        i = s.find('1')
+
+        while i >= 0:
+            ids.append(i)
+            i = s.find('1', i + 1)
+
+        return ids
+
+    def _match_grouping(
+            self, hosts, grouping, bulk=False, columns=None, memos=None):
+        # Returns list of groups matching each of the hosts
+        hosts_groups = [[] for _ in hosts]
+
+        if columns is None:
+            columns = {}
+
+        if memos is None:
+            memos = [None] * len(hosts)
+
+        # Index the values of the keys used by the exact-match rules
+        indexable = [
+            self._is_indexable(program) for group, program in grouping]
+        paths = set()
+
+        for (group, program), use_index in zip(grouping, indexable):
+            if use_index:
+                for keys in program:
+                    for key in keys:
+                        paths.add(key[1])
+
+        index = self._build_index(hosts, paths, columns)
+
+        for (group, program), use_index in zip(grouping, indexable):
+            if use_index:
+                matched = self._match_index(hosts, program, index, memos)
+            elif bulk:
+                matched = (
+                    i for i, m in enumerate(
+                        self._match_conditions_bulk(hosts, program, columns))
+                    if m)
+            else:
+                matched = (
+                    i for i, host in enumerate(hosts)
+                    if self._match_conditions(host, program, memo=memos[i]))
+
+            for i in matched:
+                hosts_groups[i].append(group)
+
+        self.display.debug(
+            "Resolved %d of %d grouping rules by the index" % (
+                sum(indexable), len(grouping)))
+
+        return hosts_groups
+
+    def _is_indexable(self, program):
+        # Only rules consisting of required keys with a single literal value
+        # can be resolved by the index
+        if len(program) == 0:
+            return False
+
+        for keys in program:
+            if len(keys) == 0:
+                return False
+
+            for k, path, optional, not_last, values in keys:
+                if (
+                        optional or
+                        len(values) != 1 or
+                        values[0][1] != self.COND_VALUE or
+                        not isinstance(values[0][0], str)):
+                    return False
+
+        return True
+
+    def _build_index(self, hosts, paths, columns):
+        # Maps path and value to the ids of the hosts having that value. Hosts
+        # with a list or unhashable value must be evaluated one by one.
+        index = {
+            'values': dict((path, {}) for path in paths),
+            'others': dict((path, set()) for path in paths),
+        }
+
+        for path in paths:
+            values = index['values'][path]
+            others = index['others'][path]
+
+            for i, (hk_exists, h_v) in enumerate(
+                    self._get_column(hosts, path, columns)):
+                if not hk_exists or h_v is None:
+                    continue
+
+                try:
+                    values.setdefault(h_v, set()).add(i)
+                except TypeError:
+                    others.add(i)
+
+        return index
+
+    def _match_index(self, hosts, program, index, memos):
+        matched = set()
+        others = set()
+
+        for keys in program:
+            exact = None
+            candidates = None
+
+            for k, path, optional, not_last, values in keys:
+                ids = index['values'][path].get(values[0][0], set())
+                key_candidates = ids | index['others'][path]
+
+                if exact is None:
+                    exact = ids
+                    candidates = key_candidates
+                else:
+                    exact = exact & ids
+                    candidates = candidates & key_candidates
+
+            matched |= exact
+            others |= candidates - exact
+
+        pending = others - matched
+
+        if self._stats is not None:
+            # The pending hosts are counted by their evaluation
+            self._stats['counters']['evaluations'] += (
+                len(hosts) - len(pending))
+
+        # Hosts with list values must be evaluated one by one
+        for i in pending:
+            if self._match_conditions(hosts[i], program, memo=memos[i]):
+                matched.add(i)
+
+        return sorted(matched)
+
+    def _populate(self, entries):
+        duplicates = 0
+
+        for name, groups, host_vars in entries:
+            # Don't add the same host twice
+            if name in self.inventory.hosts:
+                self.display.warning("Host '%s' is defined twice." % name)
+                duplicates += 1
+
+                continue
+
+            for group in groups:
+                self._create_group(group)
+                self.inventory.add_host(name, group)
+
+            if host_vars is not None:
+                for k, v in host_vars.items():
+                    self.inventory.set_variable(name, k, v)
+
+        if self._stats is not None:
+            counters = self._stats['counters']
+            counters['accepted'] += len(entries) - duplicates
+            counters['duplicates'] += duplicates
+
+    def _load_data_file(self, path, data_file, cache, stamp=None):
+        user_cache_setting = self.get_option('cache')
+        attempt_to_read_cache = user_cache_setting and cache
+        cache_needs_update = user_cache_setting and not cache
+
+        if user_cache_setting:
+            cache_key = '%s_data' % self.get_cache_key(path)
+
+            if stamp is None:
+                stamp = self._get_file_stamp(data_file)
+
+        if attempt_to_read_cache:
+            data = self._read_cache(cache_key, stamp, 'data')
+
+            if data is not None:
+                self.display.debug("Using cached data of '%s'" % data_file)
+
+                return data
+
+            cache_needs_update = True
+
+        data = self._parse_data_file(data_file)
+
+        if cache_needs_update:
+            self._cache[cache_key] = {
+                'stamp': stamp,
+                'data': data,
+            }
+
+        return data
+
+    def _read_cache(self, cache_key, stamp, field):
+        # Returns the cached value only if it's valid for the given stamp
+        try:
+            cached = self._cache[cache_key]
+        except KeyError:
+            return None
+        except AnsibleError as e:
+            self.display.vvv("Unable to read cache '%s': %s" % (cache_key, e))
+
+            return None
+
+        if (
+                isinstance(cached, dict) and
+                cached.get('stamp') == stamp and
+                isinstance(cached.get(field), list)):
+            return cached[field]
+
+        self.display.vvv("Cache '%s' is stale or corrupt" % cache_key)
+
+        return None
+
+    def _get_config_digest(self):
+        # Identifies the effective configuration of the inventory source
+        config = json.dumps(self._options, sort_keys=True, default=str)
+
+        return hashlib.sha256(config.encode('utf-8')).hexdigest()
+
+    def _parse_data_file(self, data_file):
+        # Parse the YAML file
+        self.display.debug(
+            "Loading '%s' with %s" % (data_file, SafeLoader.__name__))
+
+        with self._phase('read'):
+            content = self._read_yaml_file(data_file)
+
+        try:
+            with self._phase('load'):
+                data = yaml.load(content, Loader=SafeLoader)
+        except yaml.YAMLError as e:
+            raise AnsibleParserError(
+                "Unable parse inventory '%s': %s" % (data_file, e))
+
+        return data
+
+    def _iter_data_file(self, data_file):
+        # Parse the top-level list of the YAML file item by item
+        self.display.debug(
+            "Streaming '%s' with %s" % (data_file, StreamLoader.__name__))
+
+        try:
+            stream = open(data_file, 'r')
+        except IOError as e:
+            raise AnsibleError(
+                "E: Cannot open file '%s'.\n%s" % (data_file, e))
+
+        loader = StreamLoader(stream)
+
+        try:
+            # Skip the StreamStartEvent
+            loader.get_event()
+
+            if loader.check_event(yaml.StreamEndEvent):
+                return
+
+            # Skip the DocumentStartEvent
+            loader.get_event()
+
+            if not loader.check_event(yaml.SequenceStartEvent):
+                node = loader.compose_node(None, None)
+
+                # Empty document
+                if loader.construct_document(node) is None:
+                    return
+
+                raise AnsibleParserError(
+                    "Unable parse inventory '%s': the data must be a list" %
+                    data_file)
+
+            loader.get_event()
+
+            while not loader.check_event(yaml.SequenceEndEvent):
+                node = loader.compose_node(None, None)
+
+                yield loader.construct_document(node)
+        except yaml.YAMLError as e:
+            raise AnsibleParserError(
+                "Unable parse inventory '%s': %s" % (data_file, e))
+        finally:
+            loader.dispose()
+
+            try:
+                stream.close()
+            except IOError as e:
+                raise AnsibleError(
+                    "E: Cannot close file '%s'.\n%s" % (data_file, e))
+
+    def _get_file_stamp(self, path):
+        # Identifies the version of the file for the cache validation
+        try:
+            st = os.stat(path)
+        except OSError as e:
+            raise AnsibleError("E: Cannot stat file '%s'.\n%s" % (path, e))
+
+        stamp = [os.path.abspath(path), st.st_mtime_ns, st.st_size, None]
+
+        if self.get_option('cache_hash'):
+            stamp[3] = self._get_file_hash(path)
+
+        return stamp
+
+    def _get_file_hash(self, path):
+        h = hashlib.sha256()
+
+        try:
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    h.update(chunk)
+        except IOError as e:
+            raise AnsibleError("E: Cannot read file '%s'.\n%s" % (path, e))
+
+        return h.hexdigest()
 
     def _get_host_key_value(self, host, key):
-        hk_exists = False
-        h_v = None
+        return self._walk_key_path(host, self._split_key_path(key))
 
-        path = key.split('.')
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def _split_key_path(key):
+        path = []
 
-        # Test the path
-        for p in path:
+        for p in key.split('.'):
             # Test if the path is a ref to a list's item
-            m = re.match(r'(.*)\[(\d+)\]$', p)
+            m = InventoryModule.KEY_INDEX_RE.match(p)
             idx = None
 
             if m is not None and len(m.groups()) == 2:
                 p = m.group(1)
                 idx = int(m.group(2))
 
+            path.append((p, idx))
+
+        return tuple(path)
+
+    def _reset_path_stats(self):
+        self._path_stats = {
+            'walks': 0,
+            'hits': 0,
+        }
+
+    def _get_key_value(self, host, path, memo=None):
+        # Walks the path only once per host if the memo is given
+        if memo is None:
+            return self._walk_key_path(host, path)
+
+        try:
+            value = memo[path]
+        except KeyError:
+            value = memo[path] = self._walk_key_path(host, path)
+            self._path_stats['walks'] += 1
+        else:
+            self._path_stats['hits'] += 1
+
+        return value
+
+    def _get_column(self, hosts, path, columns):
+        # Extracts the values of the path for all hosts only once
+        if path in columns:
+            self._path_stats['hits'] += len(hosts)
+        else:
+            columns[path] = [self._walk_key_path(host, path) for host in hosts]
+            self._path_stats['walks'] += len(hosts)
+
+        return columns[path]
+
+    def _walk_key_path(self, host, path):
+        hk_exists = False
+        h_v = None
+
+        # Test the path
+        for p, idx in path:
             if p in host:
                 host = host[p]
 
@@ -328,38 +1694,147 @@ class InventoryModule(BaseFileInventoryPlugin):
 
         return hk_exists, h_v
 
-    def _eval_conditions(self, host, conditions, default=True):
-        self.display.debug("Starting %s" % ('accept' if default else 'ignore'))
-        self.display.debug("Data: %s" % host)
-
-        if len(conditions) == 0:
-            ret = default
-        else:
-            ret = False
+    def _compile_conditions(self, conditions):
+        # Turn the list of conditions into a program which can be evaluated
+        # for many hosts without re-interpreting the condition dicts
+        optional_prefix = self.get_option('optional_key_prefix')
+        program = []
 
-        # Loop through all conditions
         for c in conditions:
-            i = 0
+            keys = []
             c_len = len(c.items())
 
-            # Loop through all keys/values of each condition
-            for k, k_v in c.items():
-                i += 1
+            for i, (k, k_v) in enumerate(c.items(), 1):
                 optional = False
-                neg = False
 
                 # Check if the key is optional
-                if k.startswith(self.get_option('optional_key_prefix')):
+                if k.startswith(optional_prefix):
                     k = k[1:]
                     optional = True
 
-                # Check if the key exists in the host
-                hk_exists, h_v = self._get_host_key_value(host, k)
-
-                # Mormalize the value of the key to be always list
+                # Normalize the value of the key to be always list
                 if not isinstance(k_v, list):
                     k_v = [k_v]
 
+                values = []
+                neg = False
+
+                for v in k_v:
+                    operand = None
+                    regexp = None
+
+                    if v is None:
+                        kind = self.COND_NONE
+                    elif isinstance(v, str) and v.startswith('!~'):
+                        kind = self.COND_NEG_REGEXP
+                        operand = v[1:]
+                        regexp = self._compile_pattern(v[2:])
+                    elif isinstance(v, str) and v.startswith('~'):
+                        kind = self.COND_REGEXP
+                        regexp = self._compile_pattern(v[1:])
+                    elif isinstance(v, str) and v.startswith('!'):
+                        kind = self.COND_NEG_VALUE
+                        operand = v[1:]
+                    else:
+                        kind = self.COND_VALUE
+
+                    # Negation applies to all following values of the key
+                    if kind in (self.COND_NEG_REGEXP, self.COND_NEG_VALUE):
+                        neg = True
+
+                    values.append((v, kind, operand, regexp, neg))
+
+                keys.append((
+                    k,
+                    self._split_key_path(k),
+                    optional,
+                    i < c_len,
+                    tuple(values)))
+
+            program.append(tuple(keys))
+
+        return tuple(program)
+
+    def _get_programs(self):
+        # Compile all conditions only once
+        if self._programs is None:
+            accept = self._compile_conditions(self.get_option('accept'))
+            ignore = self._compile_conditions(self.get_option('ignore'))
+            grouping = [
+                (str(group), self._compile_conditions(conditions))
+                for group, conditions in self.get_option('grouping').items()]
+
+            self.display.debug(
+                "Compiled %d regular expressions (%d reused)" % (
+                    self._pattern_stats['compiles'],
+                    self._pattern_stats['hits']))
+
+            self._programs = (accept, ignore, grouping)
+
+        return self._programs
+
+    def _reset_patterns(self):
+        self._patterns = {}
+        self._pattern_stats = {
+            'compiles': 0,
+            'hits': 0,
+        }
+        # The programs refer to the compiled patterns
+        self._programs = None
+
+    def _compile_pattern(self, pattern):
+        # Each distinct pattern is compiled only once and then reused
+        if pattern in self._patterns:
+            self._pattern_stats['hits'] += 1
+
+            return self._count_matches(self._patterns[pattern])
+
+        try:
+            regexp = re.compile(pattern)
+        except (re.error, TypeError) as e:
+            raise AnsibleParserError(
+                "Invalid regular expression '%s': %s" % (pattern, e))
+
+        self._patterns[pattern] = regexp
+        self._pattern_stats['compiles'] += 1
+
+        return self._count_matches(regexp)
+
+    def _count_matches(self, regexp):
+        # The matches are counted only if the stats are enabled
+        if self._stats is None:
+            return regexp
+
+        return _CountedPattern(regexp, self._stats['counters'])
+
+    def _eval_conditions(self, host, conditions, default=True):
+        return self._match_conditions(
+            host, self._compile_conditions(conditions), default)
+
+    def _match_conditions(self, host, program, default=True, memo=None):
+        # Don't format any debug message if the debug is disabled
+        debug = C.DEFAULT_DEBUG
+
+        if self._stats is not None:
+            self._stats['counters']['evaluations'] += 1
+
+        if debug:
+            self.display.debug(
+                "Starting %s" % ('accept' if default else 'ignore'))
+            self.display.debug("Data: %s" % host)
+
+        if len(program) == 0:
+            ret = default
+        else:
+            ret = False
+
+        # Loop through all conditions
+        for keys in program:
+            # Loop through all keys/values of each condition
+            for k, path, optional, not_last, values in keys:
+                # Check if the key exists in the host
+                hk_exists, h_v = self._get_key_value(host, path, memo)
+
                 if hk_exists:
                     # If the key exists, normalize the value
                     if isinstance(h_v, list):
@@ -367,139 +1842,238 @@ class InventoryModule(BaseFileInventoryPlugin):
                     else:
                         h_vals = [h_v]
 
-                    neg_ret = True
-
-                    # Loop through all values of the key
-                    for v in k_v:
-                        # Check if the value is negation
-                        if v is not None and v.startswith('!'):
-                            neg = True
-
-                        # Loop through all value items
-                        for h_val in h_vals:
-                            self.display.debug(
-                                "  Key '%s' exists - comparing condition "
-                                "%s=%s with value %s" % (k, k, v, h_val))
-
-                            # Compare the host value with the condition value
-                            if v is None:
-                                if h_val is None:
-                                    self.display.debug(
-                                        "    Matched None value")
-
-                                    ret = True
-                                else:
-                                    self.display.debug(
-                                        "    Nothing matches None")
-
-                                    ret = False
-                                    neg_ret = False
-                            elif h_val is not None:
-                                if (
-                                        v.startswith('!~') and
-                                        re.match(v[2:], h_val) is not None):
-                                    self.display.debug(
-                                        "    Matched negative regexp value")
-
-                                    ret = False
-                                    neg_ret = False
-                                elif (
-                                        v.startswith('~') and
-                                        re.match(v[1:], h_val) is not None):
-                                    self.display.debug(
-                                        "    Matched regexp value")
-
-                                    ret = True
-                                elif (
-                                        v.startswith('!') and
-                                        h_val == v[1:]):
-                                    self.display.debug(
-                                        "    Matched negative value")
-
-                                    ret = False
-                                    neg_ret = False
-                                elif h_val == v:
-                                    self.display.debug("    Matched value")
-
-                                    ret = True
-                                else:
-                                    self.display.debug("    Nothing matches")
-
-                                    ret = False
-                                    neg_ret = True
-                            else:
-                                self.display.debug(
-                                    "    Nothing matches (should not happen)")
-
-                                ret = False
-                                neg_ret = False
-
-                            if not neg_ret:
-                                self.display.debug(
-                                    "  <- Breaking value loop because net_reg "
-                                    "is False")
-
-                                ret = neg_ret
-
-                                break
-                            elif not neg and ret:
-                                self.display.debug(
-                                    "  <- Breaking value loop because cond is "
-                                    "True")
-
-                                break
-                        if neg:
-                            self.display.debug("  <- Taking net_reg value")
-
-                            ret = neg_ret
+                    ret = self._match_values(k, h_vals, values, ret, debug)
                 elif optional:
-                    self.display.debug("  Key '%s' is optional" % k)
+                    if debug:
+                        self.display.debug("  Key '%s' is optional" % k)
 
-                    if i < c_len:
+                    if not_last:
                         ret = True
                 else:
-                    self.display.debug("  Key '%s' does not exist" % k)
+                    if debug:
+                        self.display.debug("  Key '%s' does not exist" % k)
 
                     ret = False
 
                 if not ret:
-                    self.display.debug(
-                        "  <- Breaking key loop because one of the values "
-                        "turn ret=False")
+                    if debug:
+                        self.display.debug(
+                            "  <- Breaking key loop because one of the values "
+                            "turn ret=False")
 
                     break
             if ret:
-                self.display.debug("  <- Breaking cond loop because ret=True")
+                if debug:
+                    self.display.debug(
+                        "  <- Breaking cond loop because ret=True")
 
                 break
 
-        self.display.debug(
-            "Finishing %s with ret=%s" % (
-                ('accept' if default else 'ignore'),
-                ret))
+        if debug:
+            self.display.debug(
+                "Finishing %s with ret=%s" % (
+                    ('accept' if default else 'ignore'),
+                    ret))
+
+        return ret
+
+    def _match_conditions_bulk(self, hosts, program, columns, default=True):
+        # Evaluates the program for all hosts at once key by key. The values
+        # of each key path are extracted into a column only once and shared
+        # by all programs evaluated with the same columns.
+        if self._stats is not None:
+            self._stats['counters']['evaluations'] += len(hosts)
+
+        if len(program) == 0:
+            return [default] * len(hosts)
+
+        result = [False] * len(hosts)
+        pending = range(len(hosts))
+
+        for keys in program:
+            if len(keys) == 0:
+                continue
+
+            active = pending
+
+            for i, key in enumerate(keys):
+                column = self._get_column(hosts, key[1], columns)
+                test = self._get_key_test(key, i > 0)
+                active = [n for n in active if test(*column[n])]
+
+                if not active:
+                    break
+
+            if active:
+                for n in active:
+                    result[n] = True
+
+                pending = [n for n in pending if not result[n]]
+
+                if not pending:
+                    break
+
+        return result
+
+    def _get_key_test(self, key, ret):
+        # Returns function evaluating a single key of a condition for the
+        # given key existence and host value. The ret is the result of the
+        # preceding keys of the condition.
+        k, path, optional, not_last, values = key
+
+        if optional:
+            missing = True if not_last else ret
+        else:
+            missing = False
+
+        # Shortcuts for a scalar host value and single condition value
+        if len(values) == 1:
+            v, kind, operand, regexp, neg = values[0]
+
+            if kind == self.COND_VALUE:
+                def scalar_test(h_v):
+                    return h_v is not None and h_v == v
+            elif kind == self.COND_REGEXP:
+                def scalar_test(h_v):
+                    return h_v is not None and (
+                        regexp.match(h_v) is not None or h_v == v)
+            elif kind == self.COND_NEG_VALUE:
+                def scalar_test(h_v):
+                    return h_v is not None and not h_v == operand
+            elif kind == self.COND_NEG_REGEXP:
+                def scalar_test(h_v):
+                    return (
+                        h_v is not None and
+                        regexp.match(h_v) is None and
+                        not h_v == operand)
+            else:
+                def scalar_test(h_v):
+                    return h_v is None
+        else:
+            scalar_test = None
+
+        def test(hk_exists, h_v):
+            if not hk_exists:
+                return missing
+            elif isinstance(h_v, list):
+                return self._match_values(k, h_v, values, ret)
+            elif scalar_test is not None:
+                return scalar_test(h_v)
+            else:
+                return self._match_values(k, [h_v], values, ret)
+
+        return test
+
+    def _match_values(self, k, h_vals, values, ret, debug=False):
+        # Evaluates all values of one key against the host value(s)
+        neg_ret = True
+
+        # Loop through all values of the key
+        for v, kind, operand, regexp, neg in values:
+            # Loop through all value items
+            for h_val in h_vals:
+                if debug:
+                    self.display.debug(
+                        "  Key '%s' exists - comparing condition "
+                        "%s=%s with value %s" % (k, k, v, h_val))
+
+                # Compare the host value with the condition value
+                if kind == self.COND_NONE:
+                    if h_val is None:
+                        if debug:
+                            self.display.debug("    Matched None value")
+
+                        ret = True
+                    else:
+                        if debug:
+                            self.display.debug("    Nothing matches None")
+
+                        ret = False
+                        neg_ret = False
+                elif h_val is not None:
+                    if (
+                            kind == self.COND_NEG_REGEXP and
+                            regexp.match(h_val) is not None):
+                        if debug:
+                            self.display.debug(
+                                "    Matched negative regexp value")
+
+                        ret = False
+                        neg_ret = False
+                    elif (
+                            kind == self.COND_REGEXP and
+                            regexp.match(h_val) is not None):
+                        if debug:
+                            self.display.debug("    Matched regexp value")
+
+                        ret = True
+                    elif operand is not None and h_val == operand:
+                        if debug:
+                            self.display.debug("    Matched negative value")
+
+                        ret = False
+                        neg_ret = False
+                    elif h_val == v:
+                        if debug:
+                            self.display.debug("    Matched value")
+
+                        ret = True
+                    else:
+                        if debug:
+                            self.display.debug("    Nothing matches")
+
+                        ret = False
+                        neg_ret = True
+                else:
+                    if debug:
+                        self.display.debug(
+                            "    Nothing matches (should not happen)")
+
+                    ret = False
+                    neg_ret = False
+
+                if not neg_ret:
+                    if debug:
+                        self.display.debug(
+                            "  <- Breaking value loop because net_reg is "
+                            "False")
+
+                    ret = neg_ret
+
+                    break
+                elif not neg and ret:
+                    if debug:
+                        self.display.debug(
+                            "  <- Breaking value loop because cond is True")
+
+                    break
+            if neg:
+                if debug:
+                    self.display.debug("  <- Taking net_reg value")
+
+                ret = neg_ret
 
         return ret
 
     def _create_group(self, group):
-        if group not in self.created_groups:
+        if group not in self._created_groups:
             self.inventory.add_group(group)
-            self.created_groups.append(group)
+            self._created_groups.add(group)
 
     def _read_yaml_file(self, path):
         # Custom method to read the content of the YAML file
-        content = ''
-
         try:
             f = open(path, 'r')
         except IOError as e:
             raise AnsibleError("E: Cannot open file '%s'.\n%s" % (path, e))
 
-        for line in f.readlines():
-            content += line
-
         try:
-            f.close()
-        except IOError as e:
-            raise AnsibleError("E: Cannot close file '%s'.\n%s" % (path, e))
+            content = f.read()
+        finally:
+            try:
+                f.close()
+            except IOError as e:
+                raise AnsibleError(
+                    "E: Cannot close file '%s'.\n%s" % (path, e))
 
         return content
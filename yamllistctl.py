@@ -1,14 +1,40 @@
 #!/usr/bin/env python
 
 import argparse
+import copy
+import errno
+import fcntl
+import hashlib
+import json
 import logging
+import os
 import re
+import shutil
+import stat
+import struct
 import sys
+import tempfile
+import time
 import yaml
 
+# Use the libyaml-based loader and dumper if PyYAML was built with it
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
 
 log = None
 
+# Sidecar index consists of the header (magic, size and modification time of
+# the data file and number of records) followed by the records (length of the
+# host name, the name, byte offset and length of the host in the data file and
+# hash of the host's text)
+INDEX_MAGIC = b'YLIDX\x00\x00\x01'
+INDEX_HEADER = struct.Struct('<8sQqI')
+INDEX_NAME = struct.Struct('<H')
+INDEX_RECORD = struct.Struct('<QI16s')
+
 
 # This helps to improve YAML formatting
 class MyDumper(yaml.Dumper):
@@ -40,10 +66,52 @@ def parse_args():
         '-s', '--stdout',
         action='store_true',
         help="Print result to stdout instead of back into the file.")
+    parser.add_argument(
+        '-b', '--backup',
+        action='store_true',
+        help="Keep the previous content of the file in the .bak file.")
+    parser.add_argument(
+        '-l', '--lock-timeout',
+        default=60,
+        type=float,
+        metavar='SECONDS',
+        help=(
+            "How long to wait for other writers to finish (default: 60)."))
+    parser.add_argument(
+        '-C', '--cas',
+        action='store_true',
+        help=(
+            "Don't lock the file while the action is applied. Instead check "
+            "that the file didn't change in the meantime and apply the "
+            "action again if it did."))
+    parser.add_argument(
+        '-r', '--cas-retries',
+        default=10,
+        type=int,
+        metavar='NUM',
+        help="How many times to apply the action again (default: 10).")
+    parser.add_argument(
+        '-i', '--in-place',
+        action='store_true',
+        help=(
+            "Rewrite only the changed, added or removed hosts and keep the "
+            "rest of the file (including comments) untouched."))
+    parser.add_argument(
+        '-x', '--index',
+        action='store_true',
+        help=(
+            "Maintain the sidecar index file (<file>.idx) allowing to search "
+            "for a host without loading the whole file."))
     parser.add_argument(
         '-d', '--debug',
         action='store_true',
         help="Show debug messages.")
+    parser.add_argument(
+        '-c', '--c-dumper',
+        action='store_true',
+        help=(
+            "Write the YAML with the libyaml dumper if available. It's much "
+            "faster but lists are not indented."))
 
     subparsers = parser.add_subparsers(help="Actions.")
 
@@ -104,17 +172,55 @@ def parse_args():
         'host',
         help="Name of the host to remove.")
 
+    parser_batch = subparsers.add_parser(
+        'batch',
+        help=(
+            "Add, set or remove many hosts at once. Each operation is a "
+            "dictionary with the 'action' key and the arguments of the "
+            "action as other keys (e.g. {\"action\": \"add\", \"host\": "
+            "\"host1\", \"ip\": \"192.168.1.1\"}). The file is written only "
+            "once after all operations are applied."))
+    parser_batch.set_defaults(action='batch')
+    parser_batch.add_argument(
+        'input',
+        nargs='?',
+        default='-',
+        help=(
+            "File with the operations as JSON lines or YAML documents "
+            "(default: STDIN)."))
+    parser_batch.add_argument(
+        '-e', '--stop-on-error',
+        action='store_true',
+        help=(
+            "Stop on the first failed operation. The operations applied "
+            "before it are still written."))
+
     return parser, parser.parse_args()
 
 
-def read_yaml_file(args):
-    log.debug("Reading YAML inventory %s" % args.file)
+def get_dumper(args):
+    if args.c_dumper:
+        return SafeDumper
+
+    return MyDumper
+
+
+def read_yaml_file(args, layout=None):
+    log.debug(
+        "Reading YAML inventory %s with %s" % (args.file, SafeLoader.__name__))
 
     data = []
 
-    with open(args.file, 'r') as stream:
+    with open(args.file, 'r', encoding='utf-8', newline='') as stream:
         try:
-            data = yaml.safe_load(stream)
+            if layout is None:
+                data = yaml.load(stream, Loader=SafeLoader)
+            else:
+                # Version of the file the layout belongs to
+                st = os.fstat(stream.fileno())
+                layout['stat'] = (st.st_size, st.st_mtime_ns)
+
+                data = load_layout(stream.read(), layout)
         except yaml.YAMLError as e:
             log.error("Cannot parse YAML file: %s" % e)
             sys.exit(1)
@@ -125,108 +231,548 @@ def read_yaml_file(args):
     return data
 
 
-def write_yaml_file(data, args):
+def load_layout(content, layout):
+    # Loads the data and records where each host is defined in the content.
+    # Each host owns the blank and comment lines preceding it.
+    loader = SafeLoader(content)
+
+    try:
+        node = loader.get_single_node()
+        data = None
+
+        if node is not None:
+            data = loader.construct_document(node)
+    finally:
+        loader.dispose()
+
+    layout['content'] = content
+    layout['records'] = {}
+
+    if (
+            not isinstance(node, yaml.SequenceNode) or
+            node.flow_style or
+            len(node.value) == 0 or
+            not all(isinstance(i, dict) for i in data)):
+        log.debug("The layout of the file is not supported")
+
+        return data
+
+    layout['start'] = skip_header(content)
+    end = layout['start']
+
+    for i, (item, item_node) in enumerate(zip(data, node.value)):
+        start = end
+        body = skip_gap(content, start)
+        end = get_node_end(content, item_node)
+
+        # Blank lines consumed by a block scalar belong to the next host
+        while end > body:
+            prev = content.rfind('\n', 0, end - 1) + 1
+
+            if prev <= body or content[prev:end].strip() != '':
+                break
+
+            end = prev
+
+        if i == 0:
+            layout['column'] = body_column(content, body)
+
+        # The item keeps its id reserved while the layout exists. The
+        # original name identifies the host even if the action renames it.
+        layout['records'][id(item)] = (
+            item, item.get('name'), start, body, end)
+
+    layout['end'] = end
+
+    return data
+
+
+def skip_header(content):
+    # Returns position after the directives and the document start marker
+    pos = 0
+
+    while True:
+        line_start = skip_gap(content, pos)
+        eol = content.find('\n', line_start)
+
+        if eol < 0:
+            eol = len(content)
+
+        line = content[line_start:eol]
+
+        if line.startswith('%'):
+            pos = eol + 1
+        elif line.startswith('---') and (
+                line[3:].strip() == '' or
+                line[3] in ' \t' and line[3:].strip().startswith('#')):
+            return eol + 1
+        else:
+            return pos
+
+
+def skip_gap(content, pos):
+    # Returns position of the first line which is not blank or comment
+    while pos < len(content):
+        eol = content.find('\n', pos)
+
+        if eol < 0:
+            eol = len(content)
+
+        line = content[pos:eol].strip()
+
+        if line != '' and not line.startswith('#'):
+            break
+
+        pos = eol + 1
+
+    return pos
+
+
+def get_node_end(content, node):
+    # Returns position after the line where the content of the node ends.
+    # The end mark of block collections points behind the following comments.
+    while (
+            isinstance(node, (yaml.SequenceNode, yaml.MappingNode)) and
+            not node.flow_style and
+            len(node.value) > 0):
+        node = node.value[-1]
+
+        if isinstance(node, tuple):
+            node = node[1]
+
+    pos = node.end_mark.index
+
+    if pos > 0 and content[pos - 1] == '\n':
+        return pos
+
+    eol = content.find('\n', pos)
+
+    if eol < 0:
+        return len(content)
+
+    return eol + 1
+
+
+def body_column(content, body):
+    # Returns indentation of the line starting at the position
+    column = 0
+
+    while content.startswith(' ', body + column):
+        column += 1
+
+    return column
+
+
+def dump_record(item, column, args):
+    text = yaml.dump([item], Dumper=get_dumper(args), default_flow_style=False)
+
+    if column > 0:
+        text = ''.join(
+            ' ' * column + line for line in text.splitlines(True))
+
+    return text
+
+
+def splice_yaml(data, args, layout, touched):
+    # Copies the untouched hosts as they are and dumps only the others
+    content = layout['content']
+    records = layout['records']
+    pieces = [content[:layout['start']]]
+    dumped = 0
+
+    for item in data:
+        record = records.get(id(item))
+
+        if record is not None and record[0] is item:
+            item, name, start, body, end = record
+
+            # Only the touched hosts can be changed
+            if (
+                    name not in touched or
+                    yaml.load(content[body:end], Loader=SafeLoader) == [item]):
+                pieces.append(content[start:end])
+
+                continue
+
+            pieces.append(content[start:body])
+            column = body_column(content, body)
+        else:
+            column = layout['column']
+
+        if pieces[-1] != '' and not pieces[-1].endswith('\n'):
+            pieces.append('\n')
+
+        pieces.append(dump_record(item, column, args))
+        dumped += 1
+
+    pieces.append(content[layout['end']:])
+
+    log.debug("Dumped %d of %d hosts" % (dumped, len(data)))
+
+    return ''.join(pieces)
+
+
+def write_yaml_file(data, args, layout=None, touched=()):
+    if layout is not None and layout['records']:
+        content = splice_yaml(data, args, layout, touched)
+    else:
+        content = "---\n\n" + yaml.dump(
+            data, Dumper=get_dumper(args), default_flow_style=False)
+
     if args.stdout:
         log.debug("Printing to STDOUT")
 
-        output = sys.stdout
+        sys.stdout.write(content)
     else:
-        log.debug("Printing back to file")
+        log.debug("Printing back to file with %s" % get_dumper(args).__name__)
+
+        write_file(args.file, content, args.backup)
+
+    return content
+
+
+def get_record_hash(text):
+    return hashlib.blake2b(text, digest_size=16).digest()
+
+
+def write_index(data, layout, args):
+    path = '%s.idx' % os.path.realpath(args.file)
+
+    if len(data) > 0 and not layout['records']:
+        log.debug("Not indexing the file")
+
+        return
+
+    log.debug("Writing index %s" % path)
+
+    content = layout['content']
+    records = []
+    count = 0
+    pos = 0
+    offset = 0
+
+    for item in data:
+        _, _, start, body, end = layout['records'][id(item)]
+        text = content[body:end].encode('utf-8')
+        offset += len(content[pos:body].encode('utf-8'))
+        pos = end
+        name = item.get('name')
+
+        if isinstance(name, str):
+            name = name.encode('utf-8')
+            records.append(INDEX_NAME.pack(len(name)))
+            records.append(name)
+            records.append(
+                INDEX_RECORD.pack(offset, len(text), get_record_hash(text)))
+            count += 1
+
+        offset += len(text)
+
+    size, mtime = layout['stat']
+
+    write_file(
+        path,
+        INDEX_HEADER.pack(INDEX_MAGIC, size, mtime, count) +
+        b''.join(records))
+
+
+def update_index(content, args):
+    # Indexes the content just written into the file
+    layout = {}
+    data = load_layout(content, layout)
+    st = os.stat(args.file)
+    layout['stat'] = (st.st_size, st.st_mtime_ns)
+
+    write_index(data or [], layout, args)
+
+
+def read_index(args):
+    # Returns list of (name, offset, length, hash) of all hosts or None if
+    # the index doesn't exist or is stale
+    path = '%s.idx' % os.path.realpath(args.file)
+
+    try:
+        with open(path, 'rb') as f:
+            content = f.read()
+
+        st = os.stat(args.file)
+    except (IOError, OSError) as e:
+        log.debug("Cannot read index %s: %s" % (path, e))
+
+        return None
+
+    try:
+        magic, size, mtime, count = INDEX_HEADER.unpack_from(content)
+    except struct.error:
+        magic = None
+
+    if magic != INDEX_MAGIC or (size, mtime) != (st.st_size, st.st_mtime_ns):
+        log.debug("Index %s is stale" % path)
+
+        return None
+
+    records = []
+    pos = INDEX_HEADER.size
+
+    try:
+        for _ in range(count):
+            name_len, = INDEX_NAME.unpack_from(content, pos)
+            pos += INDEX_NAME.size
+            name = content[pos:pos + name_len].decode('utf-8')
+            pos += name_len
+            offset, length, h = INDEX_RECORD.unpack_from(content, pos)
+            pos += INDEX_RECORD.size
+
+            records.append((name, offset, length, h))
+    except (struct.error, UnicodeDecodeError):
+        log.debug("Index %s is corrupt" % path)
+
+        return None
+
+    return records
+
+
+def search_index(args):
+    # Returns True if the search was done by the index
+    records = read_index(args)
+
+    if records is None:
+        return False
+
+    log.debug("Searching for host in the index: %s" % args.host)
+
+    for name, offset, length, h in records:
+        if name == args.host:
+            try:
+                with open(args.file, 'rb') as f:
+                    f.seek(offset)
+                    text = f.read(length)
+            except (IOError, OSError) as e:
+                log.error("Cannot read file '%s'.\n%s" % (args.file, e))
+                sys.exit(1)
+
+            if get_record_hash(text) != h:
+                log.debug("Index doesn't match the file")
+
+                return False
+
+            try:
+                data = yaml.load(text.decode('utf-8'), Loader=SafeLoader)
+            except yaml.YAMLError as e:
+                log.error("Cannot parse YAML file: %s" % e)
+                sys.exit(1)
+
+            search(data, build_index(data), args)
+
+            break
+
+    return True
+
+
+def write_file(path, content, backup=False):
+    # Write into a temporary file which replaces the original file only once
+    # it's completely written so readers never see partially written file
+    path = os.path.realpath(path)
+    directory = os.path.dirname(path)
+
+    try:
+        fd, tmp_path = tempfile.mkstemp(
+            prefix='.%s.' % os.path.basename(path), dir=directory)
+    except OSError as e:
+        log.error(
+            "Cannot create temporary file in '%s'.\n%s" % (directory, e))
+        sys.exit(1)
+
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+
+    try:
+        with os.fdopen(fd, 'wb') as output:
+            output.write(content)
+            output.flush()
+            os.fsync(output.fileno())
+
+        # Keep the mode of the original file
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+            backup = False
+
+        os.chmod(tmp_path, mode)
+
+        if backup:
+            backup_path = '%s.bak' % path
+
+            log.debug("Backing up to %s" % backup_path)
+
+            if os.path.lexists(backup_path):
+                os.remove(backup_path)
+
+            try:
+                os.link(path, backup_path)
+            except OSError:
+                shutil.copy2(path, backup_path)
+
+        os.replace(tmp_path, path)
+    except (IOError, OSError) as e:
+        log.error("Cannot write file '%s'.\n%s" % (path, e))
 
         try:
-            output = open(args.file, 'w')
-        except IOError as e:
-            log.error("Cannot open file '%s' for write.\n%s" % (args.file, e))
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+        sys.exit(1)
 
-    output.write("---\n\n")
-    output.write(yaml.dump(data, Dumper=MyDumper, default_flow_style=False))
+    # Make the rename durable
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
 
-    if not args.stdout:
         try:
-            output.close()
-        except IOError as e:
-            log.error("Cannot close file '%s'.\n%s" % (args.file, e))
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    except OSError as e:
+        log.warning("Cannot sync directory '%s'.\n%s" % (directory, e))
 
 
-def search(data, args):
-    log.debug("Searching for host: %s" % args.host)
+def build_index(data):
+    log.debug("Indexing %d hosts" % len(data))
+
+    index = {}
+
+    for n, i in enumerate(data):
+        if 'name' in i:
+            try:
+                # The first definition of the host wins
+                index.setdefault(i['name'], n)
+            except TypeError:
+                log.warning("Host name is not a scalar: %s" % i['name'])
+
+    return index
+
+
+def get_host(data, index, host):
+    n = index.get(host)
+
+    if n is None:
+        return None
+
+    return data[n]
+
+
+def remove_from_index(data, index, n, host):
+    # Shift the position of the hosts following the removed one
+    for name, pos in index.items():
+        if pos > n:
+            index[name] = pos - 1
+
+    del index[host]
 
-    for i in data:
-        if 'name' in i and i['name'] == args.host:
-            sys.stdout.write(
-                yaml.dump([i], Dumper=MyDumper, default_flow_style=False))
+    find_next_host(data, index, n, host)
+
+
+def find_next_host(data, index, start, host):
+    # Another definition of the same host becomes visible
+    for pos in range(start, len(data)):
+        if 'name' in data[pos] and data[pos]['name'] == host:
+            index[host] = pos
 
             break
 
 
-def add(data, args):
-    log.debug("Adding host: %s" % args.host)
+def rename_in_index(data, index, n, host):
+    del index[host]
+
+    find_next_host(data, index, n + 1, host)
+
+    if 'name' in data[n]:
+        name = data[n]['name']
 
-    found = False
+        try:
+            # The first definition of the host wins
+            if name not in index or index[name] > n:
+                index[name] = n
+        except TypeError:
+            log.warning("Host name is not a scalar: %s" % name)
 
-    for i in data:
-        if 'name' in i and i['name'] == args.host:
-            log.warning("Host already exists.")
 
-            found = True
+def search(data, index, args):
+    log.debug("Searching for host: %s" % args.host)
 
-            if args.ip is not None and args.ip != '':
-                if 'ip' not in i:
-                    log.info("Had no IP defined")
+    i = get_host(data, index, args.host)
 
-                    i['ip'] = args.ip
-                elif i['ip'] != args.ip:
-                    log.info("Had different IP: %s" % i['ip'])
+    if i is not None:
+        sys.stdout.write(
+            yaml.dump(
+                [i], Dumper=get_dumper(args), default_flow_style=False))
 
-                    i['ip'] = args.ip
 
-            if args.group and args.group != '':
-                groups = args.group.split(',')
+def add(data, index, args):
+    log.debug("Adding host: %s" % args.host)
 
-                if len(groups) == 1:
-                    groups = groups[0]
+    i = get_host(data, index, args.host)
 
-                if (
-                        'ansible' in i and
-                        'group' in i['ansible'] and
-                        i['ansible']['group'] != groups):
-                    log.info(
-                        "Had different ansible.group: %s" %
-                        i['ansible']['group'])
+    if i is not None:
+        log.warning("Host already exists.")
 
-                    i['ansible']['group'] = groups
-                elif (
-                        'ansible' not in i or
-                        'group' not in i['ansible']):
-                    log.info("Setting ansible.group")
+        if args.ip is not None and args.ip != '':
+            if 'ip' not in i:
+                log.info("Had no IP defined")
 
-                    if 'ansible' not in i:
-                        i['ansible'] = {}
+                i['ip'] = args.ip
+            elif i['ip'] != args.ip:
+                log.info("Had different IP: %s" % i['ip'])
 
-                    i['ansible']['group'] = groups
+                i['ip'] = args.ip
+
+        if args.group and args.group != '':
+            groups = args.group.split(',')
+
+            if len(groups) == 1:
+                groups = groups[0]
 
             if (
-                    (
-                        (
-                            'ansible' not in i or
-                            'override_ungrouped' not in i['ansible']
-                        ) and
-                        not args.override_ungrouped
-                    ) or (
-                        'ansible' in i and
-                        'override_ungrouped' in i['ansible'] and
-                        not args.override_ungrouped and
-                        i['ansible']['override_ungrouped'])):
-                log.info("Setting ansible.override_ungrouped: false")
+                    'ansible' in i and
+                    'group' in i['ansible'] and
+                    i['ansible']['group'] != groups):
+                log.info(
+                    "Had different ansible.group: %s" %
+                    i['ansible']['group'])
+
+                i['ansible']['group'] = groups
+            elif (
+                    'ansible' not in i or
+                    'group' not in i['ansible']):
+                log.info("Setting ansible.group")
 
                 if 'ansible' not in i:
                     i['ansible'] = {}
 
-                i['ansible']['override_ungrouped'] = args.override_ungrouped
-
-            break
+                i['ansible']['group'] = groups
 
-    if not found:
+        if (
+                (
+                    (
+                        'ansible' not in i or
+                        'override_ungrouped' not in i['ansible']
+                    ) and
+                    not args.override_ungrouped
+                ) or (
+                    'ansible' in i and
+                    'override_ungrouped' in i['ansible'] and
+                    not args.override_ungrouped and
+                    i['ansible']['override_ungrouped'])):
+            log.info("Setting ansible.override_ungrouped: false")
+
+            if 'ansible' not in i:
+                i['ansible'] = {}
+
+            i['ansible']['override_ungrouped'] = args.override_ungrouped
+    else:
         record = {
             'name': args.host,
         }
@@ -235,6 +781,7 @@ def add(data, args):
             record['ip'] = args.ip
 
         data.append(record)
+        index[args.host] = len(data) - 1
 
         if args.group and args.group != '':
             if 'ansible' not in data[-1]:
@@ -254,26 +801,25 @@ def add(data, args):
             data[-1]['ansible']['override_ungrouped'] = args.override_ungrouped
 
 
-def set(data, args):
+def set(data, index, args):
     log.debug("Setting property: %s" % args.path)
 
-    h_data = None
-
-    for n, i in enumerate(data):
-        if 'name' in i and i['name'] == args.host:
-            h_data = i
-
-            break
+    n = index.get(args.host)
+    h_data = get_host(data, index, args.host)
 
     if h_data is None:
         log.error("No such host was found.")
         sys.exit(127)
 
-    try:
-        value = yaml.safe_load(args.value)
-    except yaml.YAMLError as e:
-        log.error("Cannot parse value as YAML: %s" % e)
-        sys.exit(1)
+    if isinstance(args.value, str):
+        try:
+            value = yaml.load(args.value, Loader=SafeLoader)
+        except yaml.YAMLError as e:
+            log.error("Cannot parse value as YAML: %s" % e)
+            sys.exit(1)
+    else:
+        # Value from the batch operation
+        value = args.value
 
     path = args.path.split('.')
     path_len = len(path)
@@ -288,13 +834,13 @@ def set(data, args):
 
         if el_match is None:
             key = elem
-            index = None
+            item_index = None
         else:
             key = el_match.group(1)
-            index = int(el_match.group(2))
+            item_index = int(el_match.group(2))
 
         if key in h_data:
-            if index is None:
+            if item_index is None:
                 if last:
                     if value is None:
                         del h_data[key]
@@ -311,17 +857,19 @@ def set(data, args):
                         sys.exit(1)
             else:
                 if isinstance(h_data[key], list):
-                    if abs(index) < len(h_data[key]):
+                    if abs(item_index) < len(h_data[key]):
                         if last:
                             if value is None:
-                                del h_data[key][index]
+                                del h_data[key][item_index]
                             else:
-                                h_data[key][index] = value
+                                h_data[key][item_index] = value
                         else:
+                            item = h_data[key][item_index]
+
                             if (
-                                    isinstance(h_data[key][index], list) or
-                                    isinstance(h_data[key][index], dict)):
-                                h_data = h_data[key][index]
+                                    isinstance(item, list) or
+                                    isinstance(item, dict)):
+                                h_data = item
                             else:
                                 log.error(
                                     "Indexed value of '%s' is not list or "
@@ -334,7 +882,7 @@ def set(data, args):
                     log.error("Key '%s' is not list." % key)
                     sys.exit(127)
         else:
-            if index is None:
+            if item_index is None:
                 if last:
                     if value is not None:
                         h_data[key] = value
@@ -348,21 +896,301 @@ def set(data, args):
                     "Cannot create non-existing indexed value '%s'." % elem)
                 sys.exit(127)
 
+    # Renamed host
+    if 'name' not in data[n] or data[n]['name'] != args.host:
+        rename_in_index(data, index, n, args.host)
+
 
-def remove(data, args):
+def remove(data, index, args):
     log.debug("Removing host: %s" % args.host)
 
-    for n, i in enumerate(data):
-        if 'name' in i and i['name'] == args.host:
-            break
-    else:
-        n = None
+    n = index.get(args.host)
 
     if n is None:
         log.warn("No such host was found.")
     else:
         del data[n]
 
+        remove_from_index(data, index, n, args.host)
+
+
+# Actions allowed in the batch with their arguments
+BATCH_ACTIONS = {
+    'add': {
+        'func': add,
+        'required': ['host'],
+        'optional': {
+            'ip': None,
+            'group': None,
+            'override_ungrouped': True,
+        },
+    },
+    'set': {
+        'func': set,
+        'required': ['host', 'path', 'value'],
+        'optional': {},
+    },
+    'remove': {
+        'func': remove,
+        'required': ['host'],
+        'optional': {},
+    },
+}
+
+
+def read_batch(args):
+    log.debug("Reading batch operations from %s" % args.input)
+
+    try:
+        if args.input == '-':
+            content = sys.stdin.read()
+        else:
+            with open(args.input, 'r') as f:
+                content = f.read()
+    except IOError as e:
+        log.error("Cannot read file '%s'.\n%s" % (args.input, e))
+        sys.exit(1)
+
+    ops = []
+
+    try:
+        if content.lstrip().startswith('{'):
+            for line in content.splitlines():
+                if line.strip() != '':
+                    ops.append(json.loads(line))
+        else:
+            for doc in yaml.load_all(content, Loader=SafeLoader):
+                if isinstance(doc, list):
+                    ops += doc
+                elif doc is not None:
+                    ops.append(doc)
+    except (ValueError, yaml.YAMLError) as e:
+        log.error("Cannot parse batch operations: %s" % e)
+        sys.exit(1)
+
+    return ops
+
+
+def get_batch_args(op, args):
+    # Turns the operation into the same arguments as if the action was given
+    # on the command line
+    if not isinstance(op, dict):
+        raise ValueError("Operation is not a dictionary")
+
+    if op.get('action') not in BATCH_ACTIONS:
+        raise ValueError("Unknown action '%s'" % op.get('action'))
+
+    action = BATCH_ACTIONS[op['action']]
+    op_args = argparse.Namespace(**vars(args))
+    op_args.action = op['action']
+
+    for key in action['required']:
+        if key not in op:
+            raise ValueError("Missing '%s'" % key)
+
+    for key in ('host', 'path'):
+        if key in op and not isinstance(op[key], str):
+            raise ValueError("'%s' must be a string" % key)
+
+    for key, default in action['optional'].items():
+        setattr(op_args, key, default)
+
+    for key in list(action['required']) + list(action['optional']):
+        if key in op:
+            setattr(op_args, key, op[key])
+
+    if op['action'] == 'add':
+        op_args.override_ungrouped = str_to_bool(op_args.override_ungrouped)
+
+        for key in ('host', 'ip', 'group'):
+            if getattr(op_args, key) is not None:
+                setattr(op_args, key, str(getattr(op_args, key)))
+    else:
+        op_args.host = str(op_args.host)
+
+    return op_args
+
+
+def batch(data, index, args):
+    # Returns number of failed operations and the status of all operations
+    failed = 0
+    statuses = []
+
+    for n, op in enumerate(args.ops, 1):
+        try:
+            op_args = get_batch_args(op, args)
+        except ValueError as e:
+            log.error("Invalid operation #%d: %s" % (n, e))
+            statuses.append("%d error(1) %s" % (n, json.dumps(op)))
+
+            failed += 1
+
+            if args.stop_on_error:
+                break
+
+            continue
+
+        # Failed action must not leave the host half-changed
+        pos = index.get(op_args.host)
+
+        if pos is not None:
+            backup = copy.deepcopy(data[pos])
+
+        try:
+            BATCH_ACTIONS[op_args.action]['func'](data, index, op_args)
+        except SystemExit as e:
+            if pos is not None:
+                # Keep the identity of the host for the in-place write
+                data[pos].clear()
+                data[pos].update(backup)
+
+            statuses.append(
+                "%d error(%s) %s %s" % (
+                    n, e.code, op_args.action, op_args.host))
+
+            failed += 1
+
+            if args.stop_on_error:
+                break
+        else:
+            statuses.append("%d ok %s %s" % (n, op_args.action, op_args.host))
+
+    return failed, statuses
+
+
+def get_file_stamp(path):
+    # Identifies the version of the file
+    try:
+        st = os.stat(path)
+        h = hashlib.sha256()
+
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(chunk)
+    except (IOError, OSError) as e:
+        log.error("Cannot read file '%s'.\n%s" % (path, e))
+        sys.exit(1)
+
+    return st.st_mtime_ns, st.st_size, h.hexdigest()
+
+
+def lock_file(args):
+    # Waits for the exclusive lock of the lock file of the data file. The
+    # data file itself can't be locked as it's replaced on write.
+    path = '%s.lock' % os.path.realpath(args.file)
+
+    log.debug("Locking %s" % path)
+
+    try:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+    except OSError as e:
+        log.error("Cannot open lock file '%s'.\n%s" % (path, e))
+        sys.exit(1)
+
+    deadline = time.monotonic() + args.lock_timeout
+
+    while True:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+            return fd
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EACCES):
+                os.close(fd)
+                log.error("Cannot lock file '%s'.\n%s" % (path, e))
+                sys.exit(1)
+
+        if time.monotonic() >= deadline:
+            os.close(fd)
+            log.error("Timeout while waiting for the lock '%s'." % path)
+            sys.exit(1)
+
+        time.sleep(0.01)
+
+
+def unlock_file(fd):
+    fcntl.flock(fd, fcntl.LOCK_UN)
+    os.close(fd)
+
+
+def run_action(data, args):
+    # Returns number of failed operations and their status
+    result = (0, [])
+
+    # Find the hosts by their name
+    index = build_index(data)
+
+    # Decide what to do
+    if args.action == 'search':
+        search(data, index, args)
+    elif args.action == 'add':
+        add(data, index, args)
+    elif args.action == 'set':
+        set(data, index, args)
+    elif args.action == 'remove':
+        remove(data, index, args)
+    elif args.action == 'batch':
+        result = batch(data, index, args)
+
+    return result
+
+
+def get_touched_hosts(args):
+    # Returns names of the hosts which the action can change
+    if args.action == 'batch':
+        return [
+            str(op['host']) for op in args.ops
+            if isinstance(op, dict) and 'host' in op]
+
+    return [args.host]
+
+
+def update_yaml_file(args):
+    # Applies the action and writes the result while no other writer can
+    # change the file
+    touched = get_touched_hosts(args)
+
+    if not args.cas:
+        fd = lock_file(args)
+
+        try:
+            layout = {} if args.in_place else None
+            data = read_yaml_file(args, layout)
+            result = run_action(data, args)
+            content = write_yaml_file(data, args, layout, touched)
+
+            if args.index:
+                update_index(content, args)
+        finally:
+            unlock_file(fd)
+
+        return result
+
+    for attempt in range(args.cas_retries + 1):
+        stamp = get_file_stamp(args.file)
+        layout = {} if args.in_place else None
+        data = read_yaml_file(args, layout)
+        result = run_action(data, args)
+        fd = lock_file(args)
+
+        try:
+            if get_file_stamp(args.file) == stamp:
+                content = write_yaml_file(data, args, layout, touched)
+
+                if args.index:
+                    update_index(content, args)
+
+                return result
+        finally:
+            unlock_file(fd)
+
+        log.info("File changed by another writer, retrying.")
+
+    log.error(
+        "File kept changing by other writers, giving up after %d retries." %
+        args.cas_retries)
+    sys.exit(1)
+
 
 def main():
     # Read command line arguments
@@ -386,22 +1214,44 @@ def main():
         parser.print_help()
         sys.exit(1)
 
-    # Read the YAML file
-    data = read_yaml_file(args)
+    # Read the operations only once as the action can be applied repeatedly
+    if args.action == 'batch':
+        args.ops = read_batch(args)
 
-    # Decide what to do
-    if args.action == 'search':
-        search(data, args)
-    elif args.action == 'add':
-        add(data, args)
-    elif args.action == 'set':
-        set(data, args)
-    elif args.action == 'remove':
-        remove(data, args)
+    if args.action == 'search' and args.index and search_index(args):
+        failed, statuses = 0, []
+    elif args.action == 'search' or args.stdout:
+        # Read the YAML file
+        layout = None
+
+        if args.index and args.action == 'search':
+            layout = {}
+        elif args.in_place and args.action != 'search':
+            layout = {}
+
+        data = read_yaml_file(args, layout)
+        failed, statuses = run_action(data, args)
 
-    # Write YAML data back into the file
-    if args.action != 'search':
-        write_yaml_file(data, args)
+        # Rebuild the stale index
+        if args.index and args.action == 'search':
+            write_index(data, layout, args)
+
+        # Print the YAML data
+        if args.action != 'search':
+            write_yaml_file(data, args, layout, get_touched_hosts(args))
+    else:
+        # Write YAML data back into the file
+        failed, statuses = update_yaml_file(args)
+
+    # Keep the YAML printed to STDOUT parsable
+    status_stream = sys.stderr if args.stdout else sys.stdout
+
+    for status in statuses:
+        status_stream.write("%s\n" % status)
+
+    if failed:
+        log.error("%d operations failed." % failed)
+        sys.exit(1)
 
 
 if __name__ == '__main__':